@@ -5,3 +5,4 @@ os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
 os.environ.setdefault("JWT_ALGORITHM", "HS256")
 os.environ.setdefault("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 os.environ.setdefault("ANTHROPIC_API_KEY", "fake-key")
+os.environ.setdefault("AUTH_BCRYPT_ROUNDS", "4")
@@ -0,0 +1,177 @@
+"""
+Microbenchmark of the JWT auth middleware on an authenticated no-op route.
+
+Compares the pure ASGI JWTAuthMiddleware against the previous BaseHTTPMiddleware
+implementation, which ran the user query inline on the event loop.
+
+    uv run python -m scripts.bench_auth_middleware --requests 5000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.responses import Response
+
+from src.auth.middleware import PUBLIC_PATHS, PUBLIC_PREFIXES, JWTAuthMiddleware
+from src.auth.models.user import User
+from src.auth.services.auth import (
+    ALGORITHM,
+    SECRET_KEY,
+    create_access_token,
+    get_user_by_username,
+    user_cache,
+)
+from src.auth.services.revocation import revocation_list
+from src.database import Base
+
+
+class LegacyJWTAuthMiddleware(BaseHTTPMiddleware):
+    """The middleware as it was before the pure ASGI rewrite, with a sync session."""
+
+    def __init__(self, app, session_factory: sessionmaker[Session]) -> None:
+        super().__init__(app)
+        self.session_factory = session_factory
+
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        path = request.url.path
+        if path in PUBLIC_PATHS or path.startswith(PUBLIC_PREFIXES):
+            return await call_next(request)
+
+        auth_header = request.headers.get("Authorization")
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                content={"detail": "Missing or invalid Authorization header"},
+            )
+
+        try:
+            payload = jwt.decode(
+                auth_header.removeprefix("Bearer "), SECRET_KEY, algorithms=[ALGORITHM]
+            )
+            username: str | None = payload.get("sub")
+            if username is None:
+                raise JWTError("Missing sub claim")
+        except JWTError:
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                content={"detail": "Invalid or expired token"},
+            )
+
+        user = user_cache.get(username)
+        if user is None:
+            db = self.session_factory()
+            try:
+                user = get_user_by_username(db, username)
+            finally:
+                db.close()
+            if user is not None:
+                user_cache.set(username, user)
+
+        if user is None:
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                content={"detail": "User not found"},
+            )
+
+        request.state.user = user
+        return await call_next(request)
+
+
+def build_app(
+    middleware: type,
+    session_factory: sessionmaker[Session] | async_sessionmaker[AsyncSession],
+) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/noop")
+    async def noop(request: Request) -> dict[str, int]:
+        return {"id": request.state.user.id}
+
+    app.add_middleware(middleware, session_factory=session_factory)
+    return app
+
+
+async def drive(app: FastAPI, token: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    remaining = requests
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                resp = await client.get("/noop", headers=headers)
+                assert resp.status_code == 200, resp.text
+
+        # Warm up imports, route compilation and the user cache
+        await client.get("/noop", headers=headers)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the user cache so every request queries the database",
+    )
+    args = parser.parse_args()
+
+    # A file database, so threadpool lookups get their own connections
+    db_path = Path(tempfile.mkdtemp()) / "bench.db"
+    engine = create_engine(
+        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with session_factory() as db:
+        db.add(User(username="bench", hashed_password="x"))
+        db.commit()
+    token = create_access_token({"sub": "bench"})
+    async_session_factory = async_sessionmaker(
+        create_async_engine(f"sqlite+aiosqlite:///{db_path}"), expire_on_commit=False
+    )
+    # The revocation list reads revoked_tokens from the same database
+    revocation_list.session_factory = async_session_factory
+
+    if args.no_cache:
+        user_cache.maxsize = 0
+
+    for name, middleware, factory in [
+        ("BaseHTTPMiddleware (before)", LegacyJWTAuthMiddleware, session_factory),
+        ("pure ASGI (after)", JWTAuthMiddleware, async_session_factory),
+    ]:
+        user_cache.clear()
+        revocation_list.clear()
+        app = build_app(middleware, factory)
+        rps = asyncio.run(drive(app, token, args.requests, args.concurrency))
+        print(f"{name:<30} {rps:>10.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
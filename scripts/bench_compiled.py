@@ -0,0 +1,145 @@
+"""
+Per request CPU time of the Cython build in dist/ against the pure Python sources.
+
+Each build serves requests in its own process, in-process through httpx's ASGI
+transport, so the time is CPU only: the middleware, routing, validation and the
+quiz cache, without sockets. The client side is included and identical for both.
+Build dist/ first, with the extra modules to measure them too:
+
+    uv run python scripts/build_dist.py --extra
+    uv run python -m scripts.bench_compiled --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+TEXT = (
+    "The Great Barrier Reef is the world's largest coral reef system, composed of "
+    "over 2,900 individual reefs and 900 islands stretching for over 2,300 km."
+)
+
+
+async def measure(requests: int, warmup: int) -> dict[str, float]:
+    """Runs in the child, with the build under test first on sys.path."""
+    import src.routers  # noqa: F401
+    from src.database import engine
+    from src.main import app
+    from src.schema import migrate
+
+    migrate(engine)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        credentials = {"username": "bench", "password": "bench-password"}
+        await client.post("/auth/signup", json=credentials)
+        resp = await client.post("/auth/login", json=credentials)
+        headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+        cases: dict[str, tuple[str, str, dict[str, Any]]] = {
+            "me": ("GET", "/auth/me", {"headers": headers}),
+            "unauthorized": ("GET", "/auth/me", {}),
+            "quiz_cached": (
+                "POST",
+                "/quiz/",
+                {"headers": headers, "json": {"text": TEXT}},
+            ),
+        }
+        results = {}
+        for name, (method, path, kwargs) in cases.items():
+            for _ in range(warmup):
+                await client.request(method, path, **kwargs)
+            started = time.process_time()
+            for _ in range(requests):
+                await client.request(method, path, **kwargs)
+            results[name] = (time.process_time() - started) / requests * 1e6
+    return results
+
+
+def run_child(root: Path, env: dict[str, str], requests: int, warmup: int) -> dict:
+    env = env | {
+        "PYTHONPATH": str(root),
+        "DATABASE_URL": f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}",
+    }
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", str(requests), str(warmup)],
+        cwd=root,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise SystemExit(f"{root} failed:\n{result.stderr}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def pure_copy(src: Path) -> Path:
+    """The sources without the .so files, which would shadow the .py modules."""
+    root = Path(tempfile.mkdtemp())
+    shutil.copytree(src, root / "src", ignore=shutil.ignore_patterns("*.so", "*.c"))
+    return root
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--dist", type=Path, default=Path("dist"))
+    args = parser.parse_args()
+
+    if not any(args.dist.glob("src/**/*.so")):
+        raise SystemExit(f"No compiled modules in {args.dist}, run build_dist.py")
+
+    from scripts.loadtest import serve
+
+    builds = {"pure": pure_copy(Path("src")), "compiled": args.dist.resolve()}
+    fake_env = os.environ | {
+        "FAKE_ANTHROPIC_LATENCY_MS": "0",
+        "FAKE_ANTHROPIC_JITTER_MS": "0",
+    }
+    with serve(
+        "scripts.fake_anthropic:app", ["--log-level", "warning"], fake_env
+    ) as port:
+        env = os.environ | {
+            "ANTHROPIC_API_KEY": "fake-key",
+            "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{port}",
+            "JWT_SECRET_KEY": "bench-secret",
+            "AUTH_BCRYPT_ROUNDS": "4",
+            "QUIZ_RATE_LIMIT_PER_MINUTE": "100000000",
+            "QUIZ_RATE_LIMIT_BURST": "100000000",
+        }
+        # Alternated rounds, the best of each is the least disturbed by the host
+        best: dict[str, dict[str, float]] = {name: {} for name in builds}
+        for _ in range(args.rounds):
+            for name, root in builds.items():
+                for case, us in run_child(
+                    root, env, args.requests, args.warmup
+                ).items():
+                    best[name][case] = min(us, best[name].get(case, us))
+
+    print(f"{'route':<14} {'pure':>10} {'compiled':>10} {'speedup':>8}")
+    for case, pure in best["pure"].items():
+        compiled = best["compiled"][case]
+        print(f"{case:<14} {pure:>8.1f}us {compiled:>8.1f}us {pure / compiled:>7.2f}x")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        requests, warmup = int(sys.argv[2]), int(sys.argv[3])
+        print(json.dumps(asyncio.run(measure(requests, warmup))))
+    else:
+        main()
@@ -0,0 +1,108 @@
+"""
+Per request CPU time of serving cached quizzes as pre-serialized JSON bytes, against
+returning models that FastAPI validates and serializes again.
+
+Two in-process apps serve the same cached quiz payloads, through httpx's ASGI
+transport so the time is CPU only. The legacy routes parse every payload into
+models and return them, as the quiz routes used to, the bytes routes splice the
+cached payloads into the response like the quiz routes do now.
+
+    DATABASE_URL=sqlite:// uv run python -m scripts.bench_json_response --batch 100 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from scripts.bench_shared_cache import quiz_payload
+from src.quiz.models.quiz import BatchQuizItem, BatchQuizResponse, QuizResponse
+from src.quiz.services.batch import BatchResult, encode_batch
+
+
+def build_app(payloads: list[bytes]) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/legacy/quiz")
+    async def legacy_quiz() -> QuizResponse:
+        return QuizResponse(**json.loads(payloads[0]))
+
+    @app.post("/legacy/batch")
+    async def legacy_batch() -> BatchQuizResponse:
+        return BatchQuizResponse(
+            results=[
+                BatchQuizItem(index=i, quiz=QuizResponse.model_validate_json(p))
+                for i, p in enumerate(payloads)
+            ]
+        )
+
+    @app.post("/bytes/quiz", response_model=QuizResponse)
+    async def bytes_quiz() -> Response:
+        return Response(payloads[0], media_type="application/json")
+
+    @app.post("/bytes/batch", response_model=BatchQuizResponse)
+    async def bytes_batch() -> Response:
+        results: list[BatchResult] = [(p, None) for p in payloads]
+        return Response(encode_batch(results), media_type="application/json")
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int, warmup: int) -> dict[str, float]:
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for path in ("/legacy/quiz", "/bytes/quiz", "/legacy/batch", "/bytes/batch"):
+            for _ in range(warmup):
+                resp = await client.post(path)
+            started = time.process_time()
+            for _ in range(requests):
+                resp = await client.post(path)
+            results[path] = (time.process_time() - started) / requests * 1e6
+            # Both forms must be the same document
+            results[path + ":body"] = resp.json()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    payloads = [
+        QuizResponse.model_validate_json(quiz_payload(rng, args.questions))
+        .model_dump_json()
+        .encode()
+        for _ in range(args.batch)
+    ]
+    results = asyncio.run(measure(build_app(payloads), args.requests, args.warmup))
+    for route in ("quiz", "batch"):
+        if results[f"/legacy/{route}:body"] != results[f"/bytes/{route}:body"]:
+            raise SystemExit(f"The {route} routes return different documents")
+
+    size = sum(map(len, payloads))
+    print(
+        f"{args.batch} quizzes of {args.questions} questions, {size / 1024:.0f}KB "
+        "per batch response\n"
+    )
+    print(f"{'route':<8} {'models':>10} {'bytes':>10} {'speedup':>8}")
+    for route in ("quiz", "batch"):
+        legacy, raw = results[f"/legacy/{route}"], results[f"/bytes/{route}"]
+        print(f"{route:<8} {legacy:>8.0f}us {raw:>8.0f}us {legacy / raw:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
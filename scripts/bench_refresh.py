@@ -0,0 +1,85 @@
+"""
+Throughput of POST /auth/refresh against POST /auth/login, the request a client
+made to get a new access token before refresh tokens.
+
+Both routes are served in-process through httpx's ASGI transport, against a
+SQLite database, with the production bcrypt cost unless AUTH_BCRYPT_ROUNDS says
+otherwise. Each refresh exchanges the token returned by the previous one. The
+CPU time is that of the app process: bcrypt runs in the password hasher's worker
+processes, whose time only shows in the throughput.
+
+    uv run python -m scripts.bench_refresh --logins 20 --refreshes 2000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+
+async def measure(logins: int, refreshes: int) -> dict[str, tuple[float, float]]:
+    """Requests per second and app CPU milliseconds per request, by route."""
+    import src.routers  # noqa: F401
+    from src.database import engine
+    from src.main import app
+    from src.schema import migrate
+
+    migrate(engine)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        credentials = {"username": "bench", "password": "bench-password"}
+        await client.post("/auth/signup", json=credentials)
+
+        started, cpu = time.perf_counter(), time.process_time()
+        for _ in range(logins):
+            resp = await client.post("/auth/login", json=credentials)
+            resp.raise_for_status()
+        results = {
+            "login": (
+                logins / (time.perf_counter() - started),
+                (time.process_time() - cpu) / logins * 1000,
+            )
+        }
+
+        token = resp.json()["refresh_token"]
+        started, cpu = time.perf_counter(), time.process_time()
+        for _ in range(refreshes):
+            resp = await client.post("/auth/refresh", json={"refresh_token": token})
+            resp.raise_for_status()
+            token = resp.json()["refresh_token"]
+        results["refresh"] = (
+            refreshes / (time.perf_counter() - started),
+            (time.process_time() - cpu) / refreshes * 1000,
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--refreshes", type=int, default=2000)
+    args = parser.parse_args()
+
+    database = Path(tempfile.mkdtemp()) / "bench.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "fake-key")
+
+    results = asyncio.run(measure(args.logins, args.refreshes))
+    print(f"{'route':<8} {'req/s':>10} {'app cpu':>10}")
+    for route, (rate, cpu_ms) in results.items():
+        print(f"{route:<8} {rate:>10.1f} {cpu_ms:>8.2f}ms")
+    speedup = results["refresh"][0] / results["login"][0]
+    print(f"\nrefresh serves {speedup:.0f}x the requests per second of login")
+
+
+if __name__ == "__main__":
+    main()
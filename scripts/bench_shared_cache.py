@@ -0,0 +1,127 @@
+"""
+Lookup latency and memory footprint of the shared memory quiz cache against the
+per-process tiers it complements, a plain dict and the TTLCache LRU.
+
+Every cache holds the same serialized quizzes. Lookups are timed for hits and
+misses, the footprint of the per-process caches is measured with tracemalloc
+and multiplied by the workers of a host, each of which holds its own copy.
+
+    uv run python -m scripts.bench_shared_cache --entries 4096 --workers 8
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import TypeVar
+
+from src.cache import TTLCache
+from src.shared_cache import SharedMemoryCache
+
+T = TypeVar("T")
+
+
+def quiz_payload(rng: random.Random, num_questions: int) -> str:
+    words = "reef coral ocean species island climate water algae fish bird".split()
+
+    def sentence() -> str:
+        return " ".join(rng.choices(words, k=8)).capitalize()
+
+    quizzes = [
+        {"question": sentence() + "?"}
+        | {option: {"text": sentence(), "correct": option == "b"} for option in "abcd"}
+        for _ in range(num_questions)
+    ]
+    return json.dumps({"quizzes": quizzes})
+
+
+def per_lookup_ns(get: Callable[[str], object], keys: list[str], rounds: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(rounds):
+        for key in keys:
+            get(key)
+    return (time.perf_counter_ns() - started) / (rounds * len(keys))
+
+
+def traced_bytes(build: Callable[[], T]) -> tuple[T, int]:
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--entries", type=int, default=4096)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--slot-bytes", type=int, default=8192)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    items = {
+        f"{rng.getrandbits(256):064x}": quiz_payload(rng, args.questions)
+        for _ in range(args.entries)
+    }
+    keys = list(items)
+    missing = [f"{rng.getrandbits(256):064x}" for _ in range(args.entries)]
+    largest = max(len(p) for p in items.values())
+
+    # Copies, decoded like cached payloads would be, so tracemalloc sees them
+    def build_dict() -> dict[str, str]:
+        return {key: payload.encode().decode() for key, payload in items.items()}
+
+    def build_lru() -> TTLCache[str, str]:
+        lru: TTLCache[str, str] = TTLCache(args.entries, 3600)
+        for key, payload in items.items():
+            lru.set(key, payload.encode().decode())
+        return lru
+
+    plain, dict_bytes = traced_bytes(build_dict)
+    lru, lru_bytes = traced_bytes(build_lru)
+
+    # Twice the entries in slots, still a few sets overflow and evict
+    slots = 2 * args.entries
+    path = Path(tempfile.mkdtemp()) / "quiz-cache"
+    shared = SharedMemoryCache(path, slots - slots % 8, args.slot_bytes, 3600)
+    for key, payload in items.items():
+        shared.set(key, payload.encode())
+    retained = [key for key in keys if shared.get(key) is not None]
+
+    print(
+        f"{args.entries} quizzes of {args.questions} questions, largest payload "
+        f"{largest} bytes, {args.workers} workers, "
+        f"{len(retained) / len(keys):.1%} retained by the shared cache\n"
+    )
+    # Pages of the file actually allocated, the untouched part of the slots is not
+    resident = path.stat().st_blocks * 512
+    print(f"{'cache':<10} {'hit':>10} {'miss':>10} {'per worker':>12} {'per host':>12}")
+    rows = [
+        ("dict", plain.get, keys, dict_bytes, dict_bytes * args.workers),
+        ("TTLCache", lru.get, keys, lru_bytes, lru_bytes * args.workers),
+        ("shared", shared.get, retained, 0, resident),
+    ]
+    for name, get, present, worker_bytes, host_bytes in rows:
+        hit = per_lookup_ns(get, present, args.rounds)
+        miss = per_lookup_ns(get, missing, args.rounds)
+        print(
+            f"{name:<10} {hit:>8.0f}ns {miss:>8.0f}ns "
+            f"{worker_bytes / 2**20:>10.1f}MB {host_bytes / 2**20:>10.1f}MB"
+        )
+    print(
+        f"\nShared file {shared.size_bytes / 2**20:.1f}MB, {resident / 2**20:.1f}MB resident"
+    )
+    shared.close()
+    path.unlink()
+
+
+if __name__ == "__main__":
+    main()
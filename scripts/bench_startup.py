@@ -0,0 +1,84 @@
+"""
+Cold start benchmark: time from spawning a uvicorn worker to its first response.
+
+Each run starts `src.main:app` in a fresh process against an already migrated
+SQLite database, polls GET /openapi.json until it answers and kills the process.
+The import time of src.main alone is measured the same way, with -X importtime
+available for a per module breakdown.
+
+    uv run python -m scripts.bench_startup --runs 10
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from scripts.loadtest import free_port
+
+
+def time_import(env: dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import src.main"], env=env, check=True)
+    return time.perf_counter() - started
+
+
+def time_first_response(env: dict[str, str]) -> float:
+    port = free_port()
+    command = [
+        *(sys.executable, "-m", "uvicorn", "src.main:app"),
+        *("--port", str(port), "--log-level", "warning"),
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {process.returncode}")
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=1)
+                return time.perf_counter() - started
+            except httpx.TransportError:
+                time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def report(name: str, timings: list[float]) -> None:
+    ms = [t * 1000 for t in timings]
+    print(
+        f"{name:<16} min {min(ms):7.1f}ms  median {statistics.median(ms):7.1f}ms  "
+        f"max {max(ms):7.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    database_url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'startup.db'}"
+    env = os.environ | {
+        "DATABASE_URL": database_url,
+        "ANTHROPIC_API_KEY": "fake-key",
+        "DB_AUTO_MIGRATE": "false",
+    }
+    subprocess.run([sys.executable, "-m", "src.manage", "migrate"], env=env, check=True)
+
+    imports = [time_import(env) for _ in range(args.runs)]
+    responses = [time_first_response(env) for _ in range(args.runs)]
+    report("import src.main", imports)
+    report("first response", responses)
+
+
+if __name__ == "__main__":
+    main()
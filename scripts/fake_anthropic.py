@@ -0,0 +1,111 @@
+"""
+Local stand-in for the Anthropic Messages API, for load tests.
+
+Answers `POST /v1/messages` with a valid quiz after a configurable latency, and
+fails a configurable share of the calls with a 529 overloaded error, like the real
+API under load. Point the app at it with ANTHROPIC_BASE_URL.
+
+    uv run python -m scripts.fake_anthropic --port 9100 --latency-ms 800 --jitter-ms 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+from uuid import uuid4
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Read from the environment when served by uvicorn, overridden by the CLI flags
+settings = {
+    "latency_ms": float(os.getenv("FAKE_ANTHROPIC_LATENCY_MS", "500")),
+    "jitter_ms": float(os.getenv("FAKE_ANTHROPIC_JITTER_MS", "200")),
+    "error_rate": float(os.getenv("FAKE_ANTHROPIC_ERROR_RATE", "0")),
+}
+
+_NUM_QUESTIONS = re.compile(r"generate exactly (\d+)")
+
+
+def quiz_text(num_questions: int) -> str:
+    option = {"text": "Option", "correct": False}
+    quizzes = [
+        {
+            "question": f"Question {i + 1}?",
+            "a": option,
+            "b": {"text": "Right option", "correct": True},
+            "c": option,
+            "d": option,
+        }
+        for i in range(num_questions)
+    ]
+    return json.dumps({"quizzes": quizzes})
+
+
+async def messages(request: Request) -> JSONResponse:
+    body = await request.json()
+    latency = random.gauss(settings["latency_ms"], settings["jitter_ms"])
+    await asyncio.sleep(max(0.0, latency) / 1000)
+
+    if random.random() < settings["error_rate"]:
+        return JSONResponse(
+            {
+                "type": "error",
+                "error": {"type": "overloaded_error", "message": "Overloaded"},
+            },
+            status_code=529,
+        )
+
+    system = body.get("system", "")
+    if isinstance(system, list):
+        system = " ".join(block["text"] for block in system)
+    match = _NUM_QUESTIONS.search(system)
+    num_questions = int(match.group(1)) if match else 3
+    text = quiz_text(num_questions)
+    prompt = json.dumps(body["messages"])
+
+    return JSONResponse(
+        {
+            "id": f"msg_{uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            # Rough 4 chars per token, enough for the usage accounting
+            "usage": {
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": len(text) // 4,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": len(system) // 4,
+            },
+        }
+    )
+
+
+app = Starlette(routes=[Route("/v1/messages", messages, methods=["POST"])])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=settings["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=settings["jitter_ms"])
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"])
+    args = parser.parse_args()
+
+    settings.update(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+End-to-end load test of the app against the local Anthropic stand-in.
+
+Starts scripts.fake_anthropic and the app from src.main as uvicorn subprocesses,
+then at each concurrency level runs that many virtual users for a fixed duration.
+Every user signs up and logs in once, then loops over a weighted mix of routes.
+Throughput and p50/p95/p99 latency are reported per route and written as JSON,
+pass an earlier results file as --baseline to print the change between commits.
+
+    uv run python -m scripts.loadtest --concurrency 10,50 --duration 20 \\
+        --mix me=60,quiz=30,login=10 --output loadtest.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+
+ROUTES = {
+    "signup": ("POST", "/auth/signup"),
+    "login": ("POST", "/auth/login"),
+    "me": ("GET", "/auth/me"),
+    "quiz": ("POST", "/quiz/"),
+}
+
+WORDS = (
+    "reef coral ocean species island climate water algae fish bird heritage "
+    "coast warm white system world space kilometres protection pollution"
+).split()
+
+type Samples = dict[str, list[tuple[float, int]]]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+@contextmanager
+def serve(target: str, args: list[str], env: dict[str, str]) -> Iterator[int]:
+    """Run `target` with uvicorn on a free port until the block exits."""
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", target, "--port", str(port), *args]
+    process = subprocess.Popen(command, env=env)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{target} exited with {process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{target} did not start") from None
+                time.sleep(0.1)
+        yield port
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        route, weight = part.split("=")
+        if route not in ROUTES or route == "signup":
+            raise SystemExit(f"Unknown route in --mix: {route}")
+        weights[route] = int(weight)
+    return weights
+
+
+class VirtualUser:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        samples: Samples,
+        rng: random.Random,
+        distinct_texts: int,
+    ) -> None:
+        self.client = client
+        self.samples = samples
+        self.rng = rng
+        self.distinct_texts = distinct_texts
+        self.credentials = {"username": f"lt-{uuid4().hex}", "password": "loadtest"}
+        self.headers: dict[str, str] = {}
+
+    async def request(self, route: str) -> httpx.Response | None:
+        method, path = ROUTES[route]
+        kwargs: dict = {"headers": self.headers}
+        if route in ("signup", "login"):
+            kwargs["json"] = self.credentials
+        elif route == "quiz":
+            kwargs["json"] = {"text": self.text()}
+
+        started = time.perf_counter()
+        try:
+            resp = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.samples[route].append((time.perf_counter() - started, 0))
+            return None
+        self.samples[route].append((time.perf_counter() - started, resp.status_code))
+        return resp
+
+    def text(self) -> str:
+        # Unique texts miss every cache, a small pool measures the cached path
+        seed = (
+            self.rng.randrange(self.distinct_texts)
+            if self.distinct_texts
+            else self.rng.getrandbits(64)
+        )
+        words = random.Random(seed).choices(WORDS, k=60)
+        return " ".join(words).capitalize() + "."
+
+    async def run(self, weights: dict[str, int], deadline: float) -> None:
+        await self.request("signup")
+        resp = await self.request("login")
+        if resp is None or resp.status_code != 200:
+            return
+        self.headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+        routes, route_weights = list(weights), list(weights.values())
+        while time.perf_counter() < deadline:
+            await self.request(self.rng.choices(routes, route_weights)[0])
+
+
+def summarize(samples: Samples, elapsed: float) -> dict[str, dict]:
+    report = {}
+    for route, results in sorted(samples.items()):
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        statuses: dict[str, int] = defaultdict(int)
+        for _, code in results:
+            statuses[str(code)] += 1
+        cuts = (
+            statistics.quantiles(latencies, n=100, method="inclusive")
+            if len(latencies) > 1
+            else latencies * 99
+        )
+        report[route] = {
+            "requests": len(results),
+            "errors": sum(1 for _, code in results if not 200 <= code < 300),
+            "statuses": dict(statuses),
+            "rps": round(len(results) / elapsed, 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "p50_ms": round(cuts[49], 2),
+            "p95_ms": round(cuts[94], 2),
+            "p99_ms": round(cuts[98], 2),
+        }
+    return report
+
+
+async def run_level(
+    base_url: str,
+    concurrency: int,
+    duration: float,
+    weights: dict[str, int],
+    distinct_texts: int,
+    seed: int,
+) -> dict:
+    samples: Samples = defaultdict(list)
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=120
+    ) as client:
+        rng = random.Random(seed)
+        users = [
+            VirtualUser(client, samples, random.Random(rng.random()), distinct_texts)
+            for _ in range(concurrency)
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(user.run(weights, started + duration) for user in users))
+        elapsed = time.perf_counter() - started
+
+    total = sum(len(results) for results in samples.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 2),
+        "rps": round(total / elapsed, 2),
+        "routes": summarize(samples, elapsed),
+    }
+
+
+def print_report(levels: list[dict], baseline: dict | None) -> None:
+    previous = {
+        (level["concurrency"], route): stats
+        for level in (baseline or {}).get("levels", [])
+        for route, stats in level["routes"].items()
+    }
+    header = f"{'conc':>5} {'route':<8} {'req':>7} {'err':>5} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}"
+    print(header + ("   vs baseline (rps / p95)" if baseline else ""))
+    for level in levels:
+        for route, stats in level["routes"].items():
+            line = (
+                f"{level['concurrency']:>5} {route:<8} {stats['requests']:>7} "
+                f"{stats['errors']:>5} {stats['rps']:>9.1f} {stats['p50_ms']:>7.1f}ms "
+                f"{stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms"
+            )
+            if old := previous.get((level["concurrency"], route)):
+                rps = (stats["rps"] / old["rps"] - 1) * 100 if old["rps"] else 0
+                p95 = (
+                    (stats["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0
+                )
+                line += f"   {rps:+6.1f}% / {p95:+6.1f}%"
+            print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--concurrency", default="10,50")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--mix", default="me=60,quiz=30,login=10")
+    parser.add_argument(
+        "--distinct-texts",
+        type=int,
+        default=0,
+        help="Size of the pool quiz texts are drawn from, 0 makes every text unique",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument(
+        "--database-url",
+        help="Defaults to a fresh SQLite file, use Postgres for realistic numbers",
+    )
+    parser.add_argument(
+        "--app-env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Extra environment for the app, e.g. AUTH_STATELESS_TOKENS=true",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=Path("loadtest.json"))
+    parser.add_argument("--baseline", type=Path)
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    database_url = (
+        args.database_url or f"sqlite:///{Path(tempfile.mkdtemp()) / 'loadtest.db'}"
+    )
+    fake_env = os.environ | {
+        "FAKE_ANTHROPIC_LATENCY_MS": str(args.latency_ms),
+        "FAKE_ANTHROPIC_JITTER_MS": str(args.jitter_ms),
+        "FAKE_ANTHROPIC_ERROR_RATE": str(args.error_rate),
+    }
+    log_level = ["--log-level", "warning"]
+
+    with serve("scripts.fake_anthropic:app", log_level, fake_env) as fake_port:
+        # Rate limits are lifted, pass them with --app-env to measure them
+        app_env = (
+            {
+                "JWT_SECRET_KEY": "loadtest-secret",
+                "JWT_ALGORITHM": "HS256",
+                "JWT_ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+                "QUIZ_RATE_LIMIT_PER_MINUTE": "1000000",
+                "QUIZ_RATE_LIMIT_BURST": "1000000",
+            }
+            | os.environ
+            | {
+                "DATABASE_URL": database_url,
+                "ANTHROPIC_API_KEY": "fake-key",
+                "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{fake_port}",
+            }
+            | dict(item.split("=", 1) for item in args.app_env)
+        )
+        app_args = [*log_level, "--workers", str(args.workers)]
+        with serve("src.main:app", app_args, app_env) as app_port:
+            levels = [
+                asyncio.run(
+                    run_level(
+                        f"http://127.0.0.1:{app_port}",
+                        concurrency,
+                        args.duration,
+                        weights,
+                        args.distinct_texts,
+                        args.seed,
+                    )
+                )
+                for concurrency in concurrency_levels
+            ]
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "mix": weights,
+            "duration_seconds": args.duration,
+            "distinct_texts": args.distinct_texts,
+            "workers": args.workers,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "database": database_url.split(":", 1)[0],
+            "app_env": args.app_env,
+        },
+        "levels": levels,
+    }
+    args.output.write_text(json.dumps(results, indent=2))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    print_report(levels, baseline)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
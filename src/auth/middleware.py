@@ -1,68 +1,123 @@
-from fastapi import Request, status
+from fastapi import status
 from fastapi.responses import JSONResponse
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session, sessionmaker
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.responses import Response
+from prometheus_client import Counter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from src.auth.services.auth import ALGORITHM, SECRET_KEY, get_user_by_username
-from src.database import SessionLocal
+from src.auth.models.user import User
+from src.auth.services.auth import (
+    AUTH_STATELESS_TOKENS,
+    aget_user_by_username,
+    decode_access_token,
+    user_cache,
+)
+from src.auth.services.revocation import revocation_list
+from src.database import AsyncSessionLocal
 
-PUBLIC_PATHS = {"/auth/signup", "/auth/login", "/openapi.json"}
+PUBLIC_PATHS = {
+    "/auth/signup",
+    "/auth/login",
+    "/auth/refresh",
+    "/openapi.json",
+    # Process-wide internals, guarded by the metrics token instead of a user one
+    "/metrics",
+    "/auth/cache/stats",
+    "/quiz/cache/stats",
+}
 PUBLIC_PREFIXES = ("/docs",)
 
+AUTH_OUTCOMES = Counter(
+    "auth_requests", "Authentication outcomes of protected requests", ["outcome"]
+)
+_authenticated = AUTH_OUTCOMES.labels("authenticated")
+_missing_header = AUTH_OUTCOMES.labels("missing_header")
+_invalid_token = AUTH_OUTCOMES.labels("invalid_token")
+_revoked = AUTH_OUTCOMES.labels("revoked")
+_user_not_found = AUTH_OUTCOMES.labels("user_not_found")
+
+
+def _unauthorized(detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        content={"detail": detail},
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+class JWTAuthMiddleware:
+    """Pure ASGI middleware, it never wraps the response so streaming is untouched.
+
+    The authenticated user is stored in the scope state, read as `request.state.user`,
+    and the verified claims as `request.state.token_claims`. In stateless mode the
+    user is built from the claims alone, without touching the database.
+    """
 
-class JWTAuthMiddleware(BaseHTTPMiddleware):
     def __init__(
         self,
-        app,
-        session_factory: sessionmaker[Session] = SessionLocal,
+        app: ASGIApp,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
     ) -> None:
-        super().__init__(app)
+        self.app = app
         self.session_factory = session_factory
 
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        path = request.url.path
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
+        path: str = scope["path"]
         if path in PUBLIC_PATHS or path.startswith(PUBLIC_PREFIXES):
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
 
-        auth_header = request.headers.get("Authorization")
+        auth_header = Headers(scope=scope).get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={"detail": "Missing or invalid Authorization header"},
-                headers={"WWW-Authenticate": "Bearer"},
+            _missing_header.inc()
+            await _unauthorized("Missing or invalid Authorization header")(
+                scope, receive, send
             )
+            return
 
         token = auth_header.removeprefix("Bearer ")
 
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username: str | None = payload.get("sub")
-            if username is None:
-                raise JWTError("Missing sub claim")
-        except JWTError:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={"detail": "Invalid or expired token"},
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        payload = decode_access_token(token)
+        if payload is None:
+            _invalid_token.inc()
+            await _unauthorized("Invalid or expired token")(scope, receive, send)
+            return
+        username: str = payload["sub"]
+
+        jti: str | None = payload.get("jti")
+        if jti is not None and await revocation_list.is_revoked(jti):
+            _revoked.inc()
+            await _unauthorized("Token has been revoked")(scope, receive, send)
+            return
 
-        db = self.session_factory()
-        try:
-            user = get_user_by_username(db, username)
-        finally:
-            db.close()
+        user_id = payload.get("uid")
+        if AUTH_STATELESS_TOKENS and isinstance(user_id, int):
+            # Transient instance, only id and username are set
+            user = User(id=user_id, username=username)
+        else:
+            user = user_cache.get(username)
+            if user is None:
+                user = await self._load_user(username)
 
         if user is None:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={"detail": "User not found"},
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            _user_not_found.inc()
+            await _unauthorized("User not found")(scope, receive, send)
+            return
+
+        _authenticated.inc()
+        state = scope.setdefault("state", {})
+        state["user"] = user
+        state["token_claims"] = payload
+        await self.app(scope, receive, send)
+
+    async def _load_user(self, username: str) -> User | None:
+        async with self.session_factory() as db:
+            user = await aget_user_by_username(db, username)
 
-        request.state.user = user
-        return await call_next(request)
+        if user is not None:
+            user_cache.set(username, user)
+        return user
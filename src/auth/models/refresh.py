@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database import Base
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    # SHA-256 of the token, the token itself is never stored
+    token_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Every token rotated from the same login, revoked together on reuse
+    family_id: Mapped[str] = mapped_column(String(32), nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    # Set once the token was exchanged, a second exchange is a reuse
+    used_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
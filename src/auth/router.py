@@ -1,44 +1,128 @@
+from datetime import datetime, timezone
+
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth.models.user import Token, UserCreate, UserResponse
+from src.auth.models.user import (
+    RefreshRequest,
+    Token,
+    User,
+    UserCreate,
+    UserResponse,
+)
 from src.auth.services.auth import (
-    authenticate_user,
+    aauthenticate_user,
+    acreate_user,
+    aget_user_by_username,
     create_access_token,
-    create_user,
-    get_user_by_username,
+    token_claims,
+    user_cache,
+)
+from src.auth.services.passwords import PasswordHasherBusy
+from src.auth.services.refresh import (
+    InvalidRefreshToken,
+    adelete_expired_refresh_tokens,
+    arevoke_refresh_family,
+    arotate_refresh_token,
+    issue_refresh_token,
 )
-from src.database import get_db
+from src.auth.services.revocation import revocation_list
+from src.database import get_async_db
+from src.metrics import require_metrics_token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent logins, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post(
     "/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED
 )
-def signup(user_data: UserCreate, db: Session = Depends(get_db)) -> UserResponse:
-    existing = get_user_by_username(db, user_data.username)
+async def signup(
+    user_data: UserCreate, db: AsyncSession = Depends(get_async_db)
+) -> UserResponse:
+    existing = await aget_user_by_username(db, user_data.username)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken",
         )
-    user = create_user(db, user_data)
+    try:
+        user = await acreate_user(db, user_data)
+    except PasswordHasherBusy:
+        raise _hasher_busy() from None
     return UserResponse.model_validate(user)
 
 
+def _tokens(user: User, refresh_token: str, family_id: str) -> Token:
+    # The family claim lets logout revoke the refresh tokens of this session
+    access_token = create_access_token(data=token_claims(user) | {"fam": family_id})
+    return Token(
+        access_token=access_token, token_type="bearer", refresh_token=refresh_token
+    )
+
+
 @router.post("/login", response_model=Token)
-def login(credentials: UserCreate, db: Session = Depends(get_db)) -> Token:
-    user = authenticate_user(db, credentials.username, credentials.password)
+async def login(
+    credentials: UserCreate, db: AsyncSession = Depends(get_async_db)
+) -> Token:
+    try:
+        user = await aauthenticate_user(db, credentials.username, credentials.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy() from None
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
-    access_token = create_access_token(data={"sub": user.username})
-    return Token(access_token=access_token, token_type="bearer")
+    await adelete_expired_refresh_tokens(db, user.id)
+    refresh_token, family_id = issue_refresh_token(db, user.id)
+    await db.commit()
+    return _tokens(user, refresh_token, family_id)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(
+    req: RefreshRequest, db: AsyncSession = Depends(get_async_db)
+) -> Token:
+    """New access and refresh tokens for a refresh token, which can only be used once."""
+    try:
+        user, refresh_token, family_id = await arotate_refresh_token(
+            db, req.refresh_token
+        )
+    except InvalidRefreshToken:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+        ) from None
+    return _tokens(user, refresh_token, family_id)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(request: Request, db: AsyncSession = Depends(get_async_db)) -> None:
+    claims = request.state.token_claims
+    if "jti" not in claims:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token cannot be revoked",
+        )
+    expires_at = datetime.fromtimestamp(claims["exp"], timezone.utc)
+    await revocation_list.revoke(db, claims["jti"], expires_at)
+    if "fam" in claims:
+        await arevoke_refresh_family(db, claims["fam"])
 
 
 @router.get("/me", response_model=UserResponse)
 def read_current_user(request: Request) -> UserResponse:
     return UserResponse.model_validate(request.state.user)
+
+
+@router.get("/cache/stats", dependencies=[Depends(require_metrics_token)])
+def user_cache_stats() -> dict[str, int]:
+    return user_cache.stats()
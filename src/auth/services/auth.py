@@ -1,24 +1,45 @@
 import os
 from datetime import datetime, timedelta, timezone
 from typing import Any
+from uuid import uuid4
 
-import bcrypt
-from jose import jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from src.auth.models.user import User, UserCreate
+from src.auth.services.passwords import PasswordHasherBusy, password_hasher
+from src.cache import TTLCache
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "change-me")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Embed the user id in tokens, so the middleware can trust the claims without a query
+AUTH_STATELESS_TOKENS = os.getenv("AUTH_STATELESS_TOKENS", "false").lower() == "true"
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL_SECONDS = int(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+
+# Authenticated users by username, spares the middleware a query per request.
+# Holds detached User instances, so they must be treated as read-only.
+user_cache: TTLCache[str, User] = TTLCache(
+    AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL_SECONDS
+)
 
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return password_hasher.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    return password_hasher.verify(plain_password, hashed_password)
+
+
+async def ahash_password(password: str) -> str:
+    return await password_hasher.ahash(password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.averify(plain_password, hashed_password)
 
 
 def create_access_token(
@@ -28,20 +49,50 @@ def create_access_token(
     expire = datetime.now(timezone.utc) + (
         expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    to_encode.update({"exp": expire})
+    # The jti identifies the token in the revocation list
+    to_encode.update({"exp": expire, "jti": uuid4().hex})
+    from jose import jwt
+
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def decode_access_token(token: str) -> dict[str, Any] | None:
+    """Claims of a valid token, None when it is invalid, expired or has no subject."""
+    # jose is imported on first use, it is slow to import and unused at startup
+    from jose import JWTError, jwt
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+
+def token_claims(user: User) -> dict[str, Any]:
+    claims: dict[str, Any] = {"sub": user.username}
+    if AUTH_STATELESS_TOKENS:
+        claims["uid"] = user.id
+    return claims
+
+
 def get_user_by_username(db: Session, username: str) -> User | None:
     return db.query(User).filter(User.username == username).first()
 
 
+def invalidate_user(username: str) -> None:
+    """Must be called whenever a user is created, changed or deleted."""
+    user_cache.invalidate(username)
+
+
 def create_user(db: Session, user_data: UserCreate) -> User:
     hashed = hash_password(user_data.password)
     user = User(username=user_data.username, hashed_password=hashed)
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_user(user.username)
     return user
 
 
@@ -51,4 +102,49 @@ def authenticate_user(db: Session, username: str, password: str) -> User | None:
         return None
     if not verify_password(password, user.hashed_password):
         return None
+
+    # The plain password is only known now, upgrade hashes made with an old cost
+    if password_hasher.needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = hash_password(password)
+        except PasswordHasherBusy:
+            return user
+        db.commit()
+        db.refresh(user)
+        invalidate_user(user.username)
+    return user
+
+
+async def aget_user_by_username(db: AsyncSession, username: str) -> User | None:
+    return await db.scalar(select(User).where(User.username == username))
+
+
+async def acreate_user(db: AsyncSession, user_data: UserCreate) -> User:
+    hashed = await ahash_password(user_data.password)
+    user = User(username=user_data.username, hashed_password=hashed)
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.username)
+    return user
+
+
+async def aauthenticate_user(
+    db: AsyncSession, username: str, password: str
+) -> User | None:
+    user = await aget_user_by_username(db, username)
+    if user is None:
+        return None
+    if not await averify_password(password, user.hashed_password):
+        return None
+
+    # The plain password is only known now, upgrade hashes made with an old cost
+    if password_hasher.needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await ahash_password(password)
+        except PasswordHasherBusy:
+            return user
+        await db.commit()
+        await db.refresh(user)
+        invalidate_user(user.username)
     return user
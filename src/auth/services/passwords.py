@@ -0,0 +1,111 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, TypeVar
+
+import bcrypt
+
+AUTH_BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+AUTH_HASH_MAX_PENDING = int(os.getenv("AUTH_HASH_MAX_PENDING", "32"))
+
+# Not PEP 695 generics, Cython cannot compile them yet
+R = TypeVar("R")
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+# Module level functions, they are pickled to the worker processes
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _verify(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool, away from the request threadpool.
+
+    At most `max_pending` operations may be queued or running, beyond that
+    `PasswordHasherBusy` is raised immediately instead of piling up requests.
+    With `workers=0` bcrypt runs inline, which is handy for scripts.
+    """
+
+    def __init__(
+        self,
+        workers: int = AUTH_HASH_WORKERS,
+        max_pending: int = AUTH_HASH_MAX_PENDING,
+        rounds: int = AUTH_BCRYPT_ROUNDS,
+    ) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password.encode(), self.rounds).decode()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run(_verify, password.encode(), hashed.encode())
+
+    async def ahash(self, password: str) -> str:
+        return (await self._arun(_hash, password.encode(), self.rounds)).decode()
+
+    async def averify(self, password: str, hashed: str) -> bool:
+        return await self._arun(_verify, password.encode(), hashed.encode())
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        return int(hashed.split("$")[2]) != self.rounds
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    def _run(self, func: Callable[..., R], *args: Any) -> R:
+        executor = self._admit()
+        try:
+            if executor is None:
+                return func(*args)
+            return executor.submit(func, *args).result()
+        finally:
+            self._release()
+
+    async def _arun(self, func: Callable[..., R], *args: Any) -> R:
+        executor = self._admit()
+        try:
+            if executor is None:
+                return func(*args)
+            return await asyncio.wrap_future(executor.submit(func, *args))
+        finally:
+            self._release()
+
+    def _admit(self) -> ProcessPoolExecutor | None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordHasherBusy
+            self._pending += 1
+            if self._executor is None and self.workers > 0:
+                # Never fork(), the server process is multi-threaded
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+            return self._executor
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models.refresh import RefreshToken
+from src.auth.models.user import User
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("JWT_REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+logger = logging.getLogger("uvicorn")
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+def hash_refresh_token(token: str) -> str:
+    # 256 random bits, a fast hash is enough, unlike for passwords
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(
+    db: AsyncSession, user_id: int, family_id: str | None = None
+) -> tuple[str, str]:
+    """A new refresh token and its family, a new one unless rotating. Not committed."""
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    family_id = family_id or uuid4().hex
+    db.add(
+        RefreshToken(
+            token_hash=hash_refresh_token(token),
+            family_id=family_id,
+            user_id=user_id,
+            expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+    )
+    return token, family_id
+
+
+async def adelete_expired_refresh_tokens(db: AsyncSession, user_id: int) -> None:
+    await db.execute(
+        delete(RefreshToken).where(
+            RefreshToken.user_id == user_id,
+            RefreshToken.expires_at <= datetime.now(timezone.utc),
+        )
+    )
+
+
+async def arevoke_refresh_family(db: AsyncSession, family_id: str) -> None:
+    await db.execute(delete(RefreshToken).where(RefreshToken.family_id == family_id))
+    await db.commit()
+
+
+async def arotate_refresh_token(db: AsyncSession, token: str) -> tuple[User, str, str]:
+    """Exchange a refresh token for its user and a new token of the same family.
+
+    The token is claimed with a single conditional update, so of two concurrent
+    exchanges only one succeeds. Presenting an already exchanged token means it
+    leaked: its whole family is revoked and the legitimate client logs in again.
+    """
+    token_hash = hash_refresh_token(token)
+    now = datetime.now(timezone.utc)
+    claimed = (
+        await db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.used_at.is_(None),
+                RefreshToken.expires_at > now,
+            )
+            .values(used_at=now)
+            .returning(RefreshToken.user_id, RefreshToken.family_id)
+        )
+    ).first()
+    if claimed is None:
+        family_id = await db.scalar(
+            select(RefreshToken.family_id).where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.used_at.is_not(None),
+            )
+        )
+        if family_id is not None:
+            logger.warning("Refresh token reused, revoking family %s", family_id)
+            await arevoke_refresh_family(db, family_id)
+        raise InvalidRefreshToken
+
+    user_id, family_id = claimed
+    user = await db.get(User, user_id)
+    if user is None:
+        await db.rollback()
+        raise InvalidRefreshToken
+    new_token, _ = issue_refresh_token(db, user_id, family_id)
+    await db.commit()
+    return user, new_token, family_id
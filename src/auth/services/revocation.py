@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.auth.models.revocation import RevokedToken
+from src.database import AsyncSessionLocal
+
+AUTH_REVOCATION_REFRESH_SECONDS = float(
+    os.getenv("AUTH_REVOCATION_REFRESH_SECONDS", "30")
+)
+
+logger = logging.getLogger("uvicorn")
+
+
+class RevocationList:
+    """In-memory set of revoked token ids, periodically reloaded from Postgres.
+
+    Only tokens that have not expired yet are loaded, so the set stays small.
+    A token revoked on another worker is honoured here after at most
+    `refresh_interval` seconds. Until the first load succeeds every check waits
+    for it, later reloads happen while the current set keeps being served.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        refresh_interval: float = AUTH_REVOCATION_REFRESH_SECONDS,
+    ) -> None:
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self._revoked: frozenset[str] = frozenset()
+        # Revoked on this worker while a reload ran, its snapshot may predate them
+        self._revoked_meanwhile: set[str] = set()
+        self._loaded = False
+        self._loaded_at = float("-inf")
+        self._refreshing = False
+        self._first_load: asyncio.Future[None] | None = None
+
+    async def is_revoked(self, jti: str) -> bool:
+        if not self._loaded:
+            await self._load()
+        elif time.monotonic() - self._loaded_at > self.refresh_interval:
+            await self.refresh()
+        return jti in self._revoked
+
+    async def _load(self) -> None:
+        # Concurrent checks share the load, `refresh` alone would let them through
+        if self._first_load is None or self._first_load.done():
+            self._first_load = asyncio.ensure_future(self.refresh())
+        await asyncio.shield(self._first_load)
+
+    async def refresh(self) -> None:
+        # Concurrent requests keep using the current set meanwhile
+        if self._refreshing:
+            return
+
+        self._refreshing = True
+        self._revoked_meanwhile = set()
+        try:
+            async with self.session_factory() as db:
+                jtis = await db.scalars(
+                    select(RevokedToken.jti).where(
+                        RevokedToken.expires_at > datetime.now(timezone.utc)
+                    )
+                )
+                self._revoked = frozenset(jtis) | self._revoked_meanwhile
+                self._loaded = True
+        except SQLAlchemyError:
+            logger.warning("Could not refresh the token revocation list", exc_info=True)
+        finally:
+            # On failure the stale set is kept until the next interval
+            self._loaded_at = time.monotonic()
+            self._refreshing = False
+
+    async def revoke(self, db: AsyncSession, jti: str, expires_at: datetime) -> None:
+        await db.merge(RevokedToken(jti=jti, expires_at=expires_at))
+        await db.commit()
+        self._revoked = self._revoked | {jti}
+        self._revoked_meanwhile.add(jti)
+
+    def clear(self) -> None:
+        self._revoked = frozenset()
+        self._revoked_meanwhile = set()
+        self._loaded = False
+        self._loaded_at = float("-inf")
+        self._first_load = None
+
+
+revocation_list = RevocationList()
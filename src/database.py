@@ -1,16 +1,70 @@
 import os
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
+from typing import Any
 
-from sqlalchemy import create_engine
+from sqlalchemy import URL, create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
+from src.metrics import instrument_engine
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
-engine = create_engine(DATABASE_URL)
+# Per engine, a worker has a sync and an async one: size them so that
+# workers * 2 * (size + overflow) fits max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+# 0 disables the server side statement timeout
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def _pool_options(url: URL) -> dict[str, Any]:
+    # SQLite uses its own single connection pools, which take no sizing
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+    }
+
+
+def async_database_url(url: URL) -> URL:
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+db_url = make_url(DATABASE_URL)
+sync_connect_args: dict[str, Any] = {}
+async_connect_args: dict[str, Any] = {}
+if DB_STATEMENT_TIMEOUT_MS and db_url.get_backend_name() == "postgresql":
+    sync_connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    async_connect_args["server_settings"] = {
+        "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)
+    }
+
+# The sync engine is kept for scripts and the code paths that still run in threads
+engine = create_engine(db_url, connect_args=sync_connect_args, **_pool_options(db_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    async_database_url(db_url), connect_args=async_connect_args, **_pool_options(db_url)
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
 
 class Base(DeclarativeBase):
     pass
@@ -22,3 +76,8 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,18 +1,36 @@
+import asyncio
+import importlib
+import json
 import logging
 import os
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from pathlib import Path
 
-import anthropic
-import sentry_sdk
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
-from scalar_fastapi import get_scalar_api_reference
+from fastapi.responses import HTMLResponse
 
 from src.auth.middleware import JWTAuthMiddleware
-from src.database import Base, engine
+from src.auth.services.passwords import password_hasher
+from src.auth.services.revocation import revocation_list
+from src.database import engine
+from src.metrics import MetricsMiddleware, mark_process_dead
+from src.metrics import router as metrics_router
+from src.quiz.services.cache import quiz_cache
+from src.quiz.services.history import history_writer
+from src.quiz.services.jobs import QuizJobWorker
+from src.quiz.services.quiz import app_anthropic_client
+from src.quiz.services.similarity import similarity_index
 from src.routers import all_routers
+from src.schema import ensure_schema
+
+# Written at build time by `python -m src.manage openapi`, built on demand if missing
+OPENAPI_SCHEMA_PATH = Path(
+    os.getenv("OPENAPI_SCHEMA_PATH") or Path(__file__).with_name("openapi.json")
+)
+# Slow to import and not needed to serve the first request, loaded in the background
+PRELOAD_MODULES = ("anthropic", "jose.jwt")
 
 # Init GlitchTip/Sentry crash reporting in production
 if os.getenv("ENVIRONMENT", "development") == "production":
@@ -23,16 +41,50 @@ if os.getenv("ENVIRONMENT", "development") == "production":
             "SENTRY_DSN not set in production environment"
         )
     else:
+        import sentry_sdk
+
         sentry_sdk.init(dsn)
 
 openapi_title = "Gen AI Demo API"
 
 
+def log_index_load_error(future: asyncio.Future[None]) -> None:
+    if not future.cancelled() and (exc := future.exception()) is not None:
+        logging.getLogger("uvicorn").error(
+            "Failed to load the similarity index", exc_info=exc
+        )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    # Create tables if they don't exist yet
-    Base.metadata.create_all(bind=engine)
+    # Only checks the version, the tables are created by `python -m src.manage migrate`
+    ensure_schema(engine)
+    # Revoked tokens must be known before the first request is authenticated
+    await revocation_list.refresh()
+
+    loop = asyncio.get_running_loop()
+    # Lookups miss until the entries are loaded, startup does not wait for them
+    index_load = loop.run_in_executor(None, similarity_index.load)
+    index_load.add_done_callback(log_index_load_error)
+    for module in PRELOAD_MODULES:
+        loop.run_in_executor(None, importlib.import_module, module)
+
+    # One pooled Anthropic client per worker, created by the first quiz request
+    job_worker = QuizJobWorker(lambda: app_anthropic_client(app))
+    job_worker.start()
+    history_writer.start()
     yield
+    await job_worker.stop()
+    # After the job worker, so quizzes it completed while stopping are written too
+    await history_writer.stop()
+    # Still loading on a quick restart, the file must not be closed under it
+    await asyncio.gather(index_load, return_exceptions=True)
+    similarity_index.close()
+    quiz_cache.close()
+    mark_process_dead()
+    if client := getattr(app.state, "anthropic_client", None):
+        await client.close()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -46,9 +98,7 @@ app = FastAPI(
 
 
 # Expose Bearer auth in the OpenAPI schema for Scalar
-def custom_openapi() -> dict:
-    if app.openapi_schema:
-        return app.openapi_schema
+def build_openapi() -> dict:
     from fastapi.openapi.utils import get_openapi
 
     schema = get_openapi(
@@ -65,10 +115,19 @@ def custom_openapi() -> dict:
         }
     }
     schema["security"] = [{"BearerAuth": []}]
-    app.openapi_schema = schema
     return schema
 
 
+def custom_openapi() -> dict:
+    if not app.openapi_schema:
+        app.openapi_schema = (
+            json.loads(OPENAPI_SCHEMA_PATH.read_bytes())
+            if OPENAPI_SCHEMA_PATH.exists()
+            else build_openapi()
+        )
+    return app.openapi_schema
+
+
 app.openapi = custom_openapi  # ty:ignore[invalid-assignment]
 
 cors_env = os.getenv("CORS_ORIGINS")
@@ -82,12 +141,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.add_middleware(JWTAuthMiddleware)  # ty:ignore[invalid-argument-type]
+# Added last so it is outermost and also times requests rejected by the auth
+app.add_middleware(MetricsMiddleware)  # ty:ignore[invalid-argument-type]
 
 logger = logging.getLogger("uvicorn")
 
 
 for router in all_routers:
     app.include_router(router)
+app.include_router(metrics_router)
 
 
 # Serve Scalar docs only in development
@@ -95,6 +157,8 @@ if os.getenv("ENVIRONMENT", "production") == "development":
 
     @app.get("/docs", include_in_schema=False)
     async def scalar_html() -> HTMLResponse:
+        from scalar_fastapi import get_scalar_api_reference
+
         return get_scalar_api_reference(
             title=openapi_title,
             openapi_url=app.openapi_url,
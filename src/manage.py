@@ -0,0 +1,51 @@
+"""
+Operational commands, run once per deploy rather than by every worker.
+
+    python -m src.manage migrate
+    python -m src.manage check
+    python -m src.manage openapi --output src/openapi.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="Create missing tables, record the version")
+    commands.add_parser("check", help="Exit with 1 if the schema is out of date")
+    openapi = commands.add_parser("openapi", help="Prebuild the OpenAPI schema")
+    openapi.add_argument(
+        "--output", type=Path, default=Path(__file__).with_name("openapi.json")
+    )
+    args = parser.parse_args()
+
+    if args.command == "openapi":
+        from src.main import build_openapi
+
+        args.output.write_text(json.dumps(build_openapi()))
+        print(f"OpenAPI schema written to {args.output}")
+        return
+
+    # Registers every model on Base
+    import src.routers  # noqa: F401
+    from src.database import engine
+    from src.schema import SCHEMA_VERSION, current_version, migrate
+
+    if args.command == "migrate":
+        migrate(engine)
+        return
+
+    version = current_version(engine)
+    print(f"Database schema version {version}, expected {SCHEMA_VERSION}")
+    if version is None or version < SCHEMA_VERSION:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
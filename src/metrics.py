@@ -0,0 +1,125 @@
+import os
+import secrets
+import time
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Set with several uvicorn workers, each process then writes its samples there
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# Bearer token of the scraper, /metrics is not served at all without one
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, until the response has been fully sent",
+    ["method", "route", "status"],
+)
+DB_CONNECTION_HELD = Histogram(
+    "db_connection_held_seconds",
+    "Time a connection stays checked out of the pool",
+    ["engine"],
+)
+DB_CONNECTIONS_CHECKED_OUT = Gauge(
+    "db_connections_checked_out",
+    "Connections currently checked out of the pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+
+router = APIRouter(tags=["metrics"])
+
+
+def require_metrics_token(request: Request) -> None:
+    """Guards the operator endpoints, which are public to the JWT middleware."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    expected = f"Bearer {METRICS_TOKEN}".encode()
+    given = request.headers.get("Authorization", "").encode()
+    if not secrets.compare_digest(given, expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(request: Request) -> Response:
+    require_metrics_token(request)
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Aggregate the samples of every worker, not just the one serving the scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauges, call when it shuts down."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request, labelled with its route template."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The template, not the raw path, so ids do not explode the label set.
+            # Requests rejected before routing, like a 401, have no route.
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Record the checked out connections of `engine` and how long they are held.
+
+    Only the pool's public events are used. A pool running out of connections
+    shows as `db_connections_checked_out` reaching its size plus overflow.
+    """
+    pool = engine.pool
+    held = DB_CONNECTION_HELD.labels(name)
+    checked_out = DB_CONNECTIONS_CHECKED_OUT.labels(name)
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        checked_out.inc()
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record) -> None:
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            held.observe(time.perf_counter() - checked_out_at)
+            checked_out.dec()
@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database import Base
+from src.quiz.models.quiz import QuizResponse
+
+
+class QuizHistory(Base):
+    __tablename__ = "quiz_history"
+    # Serves the keyset pagination of a user's history, newest first
+    __table_args__ = (
+        Index("ix_quiz_history_owner_created_id", "owner_id", "created_at", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # sha256 of the whitespace-normalized source text, the text itself is not stored
+    text_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    # Set when the quiz is generated, not when the batch reaches the database
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+
+
+class QuizHistoryItem(BaseModel):
+    id: int
+    text_hash: str
+    created_at: datetime
+    quiz: QuizResponse
+
+
+class QuizHistoryPage(BaseModel):
+    items: list[QuizHistoryItem]
+    # Pass back as `cursor` to get the next page, None on the last page
+    next_cursor: str | None = None
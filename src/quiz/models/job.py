@@ -0,0 +1,55 @@
+from datetime import datetime
+from enum import StrEnum
+from typing import Any
+from uuid import uuid4
+
+from pydantic import BaseModel
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database import Base
+from src.quiz.models.quiz import QuizResponse
+
+
+class JobStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class QuizJob(Base):
+    __tablename__ = "quiz_jobs"
+    # Workers poll for the oldest claimable job
+    __table_args__ = (Index("ix_quiz_jobs_status_run_at", "status", "run_at"),)
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid4())
+    )
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    status: Mapped[str] = mapped_column(
+        String(16), nullable=False, default=JobStatus.PENDING
+    )
+    request: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    result: Mapped[dict[str, Any] | None] = mapped_column(JSON, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    # Not claimable before this time, used for retry backoff
+    run_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # Lease of the worker running the job, once expired the job can be reclaimed
+    locked_until: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
+class QuizJobResponse(BaseModel):
+    id: str
+    status: JobStatus
+    attempts: int
+    result: QuizResponse | None = None
+    error: str | None = None
+
+    model_config = {"from_attributes": True}
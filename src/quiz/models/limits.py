@@ -0,0 +1,13 @@
+from sqlalchemy import Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database import Base
+
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    # Unix time of the last refill, shared by every worker
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)
@@ -1,8 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class QuizRequest(BaseModel):
     text: str
+    num_questions: int = Field(default=3, ge=1, le=10)
+    # Split long texts into chunks and generate candidate questions per chunk
+    long_document: bool = False
+    questions_per_chunk: int = Field(default=3, ge=1, le=10)
 
 
 class Option(BaseModel):
@@ -20,3 +24,17 @@ class Quiz(BaseModel):
 
 class QuizResponse(BaseModel):
     quizzes: list[Quiz]
+
+
+class BatchQuizRequest(BaseModel):
+    texts: list[str]
+
+
+class BatchQuizItem(BaseModel):
+    index: int
+    quiz: QuizResponse | None = None
+    error: str | None = None
+
+
+class BatchQuizResponse(BaseModel):
+    results: list[BatchQuizItem]
@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class TokenUsage(BaseModel):
+    calls: int = 0
+    input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    output_tokens: int = 0
+    latency_seconds: float = 0.0
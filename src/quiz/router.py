@@ -1,11 +1,255 @@
-from fastapi import APIRouter
+import json
+import logging
+from collections.abc import AsyncIterator
+from typing import TYPE_CHECKING
 
-from src.quiz.models.quiz import QuizRequest, QuizResponse
-from src.quiz.services.quiz import create_quiz
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.database import get_async_db, get_db
+from src.metrics import require_metrics_token
+from src.quiz.models.history import QuizHistoryPage
+from src.quiz.models.job import QuizJobResponse
+from src.quiz.models.quiz import (
+    BatchQuizRequest,
+    BatchQuizResponse,
+    Quiz,
+    QuizRequest,
+    QuizResponse,
+)
+from src.quiz.models.usage import TokenUsage
+from src.quiz.services.batch import (
+    QUIZ_BATCH_MAX_ITEMS,
+    acreate_quiz_batch,
+    encode_batch,
+)
+from src.quiz.services.budget import (
+    InputTooLarge,
+    check_document_budget,
+    check_input_budget,
+)
+from src.quiz.services.cache import quiz_cache
+from src.quiz.services.chunking import (
+    TooManyChunks,
+    agenerate_quiz_json,
+    document_chunks,
+)
+from src.quiz.services.history import (
+    QUIZ_HISTORY_PAGE_SIZE,
+    decode_cursor,
+    history_writer,
+    list_history,
+)
+from src.quiz.services.jobs import enqueue_job, get_job
+from src.quiz.services.limits import (
+    RateLimited,
+    UpstreamBusy,
+    rate_limiter,
+    retry_after_header,
+    upstream_limiter,
+)
+from src.quiz.services.quiz import (
+    astream_quiz,
+    async_quiz_flight,
+    get_anthropic_client,
+    quiz_flight,
+)
+from src.quiz.services.similarity import similarity_index
+from src.quiz.services.usage import usage_tracker
+
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
 
 router = APIRouter(prefix="/quiz", tags=["quiz"])
 
+logger = logging.getLogger("uvicorn")
+
+
+async def spend_rate_limit(request: Request, cost: float) -> None:
+    """Spend `cost` tokens from the user's bucket, or fail fast with a 429."""
+    try:
+        await rate_limiter.acquire(str(request.state.user.id), cost)
+    except RateLimited as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers=retry_after_header(exc.retry_after),
+        ) from exc
+
+
+async def rate_limit(request: Request) -> None:
+    await spend_rate_limit(request, 1)
+
+
+def input_budget(text: str, long_document: bool = False) -> None:
+    """413 before any work for a text too large to be sent whole, or to be chunked."""
+    try:
+        if long_document:
+            check_document_budget(text)
+        else:
+            check_input_budget(text)
+    except InputTooLarge as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=str(exc)
+        ) from exc
+
+
+async def rate_limit_quiz(req: QuizRequest, request: Request) -> None:
+    """One token per upstream call, a long document costs one per chunk."""
+    input_budget(req.text, req.long_document)
+    cost = 1
+    if req.long_document:
+        try:
+            cost = len(document_chunks(req.text))
+        except TooManyChunks as exc:
+            raise HTTPException(
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=str(exc)
+            ) from exc
+    await spend_rate_limit(request, cost)
+
+
+def upstream_busy(exc: UpstreamBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Quiz generation is at capacity, please retry shortly",
+        headers=retry_after_header(exc.retry_after),
+    )
+
+
+def json_response(payload: bytes) -> Response:
+    """Sends already validated JSON as is, FastAPI would validate and serialize it again."""
+    return Response(payload, media_type="application/json")
+
+
+@router.post("/", response_model=QuizResponse, dependencies=[Depends(rate_limit_quiz)])
+async def generate_quiz(
+    req: QuizRequest,
+    request: Request,
+    client: "AsyncAnthropic" = Depends(get_anthropic_client),
+) -> Response:
+    try:
+        payload = await agenerate_quiz_json(req, client, request.state.user.id)
+    except UpstreamBusy as exc:
+        raise upstream_busy(exc) from exc
+    history_writer.record(request.state.user.id, req.text, payload)
+    return json_response(payload)
+
+
+@router.post(
+    "/stream", response_class=StreamingResponse, dependencies=[Depends(rate_limit)]
+)
+async def stream_quiz(
+    req: QuizRequest,
+    request: Request,
+    client: "AsyncAnthropic" = Depends(get_anthropic_client),
+) -> StreamingResponse:
+    """Stream the quizzes as NDJSON, one `Quiz` object per line."""
+    # Streamed quizzes come from a single call, long documents are not chunked here
+    input_budget(req.text)
+    # Checked while the status can still be a 503, the slot itself is taken later
+    try:
+        upstream_limiter.check()
+    except UpstreamBusy as exc:
+        raise upstream_busy(exc) from exc
+    user_id = request.state.user.id
+
+    async def ndjson() -> AsyncIterator[str]:
+        quizzes: list[Quiz] = []
+        try:
+            async for quiz in astream_quiz(
+                req.text, client, req.num_questions, user_id
+            ):
+                quizzes.append(quiz)
+                yield quiz.model_dump_json() + "\n"
+        except UpstreamBusy:
+            yield json.dumps({"detail": "Quiz generation is at capacity"}) + "\n"
+        except Exception:
+            # Headers are already sent, so the failure is reported in-band
+            logger.exception("Quiz streaming failed")
+            yield json.dumps({"detail": "Quiz generation failed"}) + "\n"
+        else:
+            history_writer.record(user_id, req.text, QuizResponse(quizzes=quizzes))
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.post("/batch", response_model=BatchQuizResponse)
+async def generate_quiz_batch(
+    req: BatchQuizRequest,
+    request: Request,
+    client: "AsyncAnthropic" = Depends(get_anthropic_client),
+) -> Response:
+    if len(req.texts) > QUIZ_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"A batch can contain at most {QUIZ_BATCH_MAX_ITEMS} texts",
+        )
+    # One token per text, a batch larger than the burst leaves the bucket in debt
+    await spend_rate_limit(request, len(req.texts))
+    user_id = request.state.user.id
+    results = await acreate_quiz_batch(req.texts, client, user_id=user_id)
+    for text, (payload, _) in zip(req.texts, results):
+        if payload is not None:
+            history_writer.record(user_id, text, payload)
+    return json_response(encode_batch(results))
+
+
+@router.post(
+    "/jobs",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit_quiz)],
+)
+def enqueue_quiz_job(
+    req: QuizRequest, request: Request, db: Session = Depends(get_db)
+) -> QuizJobResponse:
+    job = enqueue_job(db, request.state.user.id, req)
+    return QuizJobResponse.model_validate(job)
+
+
+@router.get("/jobs/{job_id}")
+def read_quiz_job(
+    job_id: str, request: Request, db: Session = Depends(get_db)
+) -> QuizJobResponse:
+    job = get_job(db, job_id, request.state.user.id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+    return QuizJobResponse.model_validate(job)
+
+
+@router.get("/history")
+async def read_history(
+    request: Request,
+    limit: int = Query(QUIZ_HISTORY_PAGE_SIZE, ge=1, le=100),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> QuizHistoryPage:
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            ) from exc
+    return await list_history(db, request.state.user.id, limit, after)
+
+
+@router.get("/cache/stats", dependencies=[Depends(require_metrics_token)])
+def cache_stats() -> dict[str, int]:
+    return {
+        **quiz_cache.stats(),
+        "coalesced": quiz_flight.shared + async_quiz_flight.shared,
+        "similar_hits": similarity_index.hits,
+        "similarity_index_size": len(similarity_index),
+        "upstream_in_flight": upstream_limiter.in_flight,
+        "upstream_rejected": upstream_limiter.rejected,
+    }
+
 
-@router.post("/")
-def generate_quiz(req: QuizRequest) -> QuizResponse:
-    return create_quiz(req.text)
+@router.get("/usage")
+def read_usage(request: Request) -> TokenUsage:
+    return usage_tracker.for_user(request.state.user.id)
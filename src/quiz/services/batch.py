@@ -0,0 +1,54 @@
+import asyncio
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, TypeAlias
+
+from src.quiz.services.quiz import acreate_quiz_json
+
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+
+QUIZ_BATCH_CONCURRENCY = int(os.getenv("QUIZ_BATCH_CONCURRENCY", "8"))
+QUIZ_BATCH_MAX_ITEMS = int(os.getenv("QUIZ_BATCH_MAX_ITEMS", "100"))
+
+logger = logging.getLogger("uvicorn")
+
+# The serialized quiz of a text, or the error it failed with
+BatchResult: TypeAlias = tuple[bytes | None, str | None]
+
+
+async def acreate_quiz_batch(
+    texts: list[str],
+    client: "AsyncAnthropic",
+    concurrency: int = QUIZ_BATCH_CONCURRENCY,
+    user_id: int | None = None,
+) -> list[BatchResult]:
+    """Generate one quiz per text, at most `concurrency` upstream calls at a time.
+
+    A failing text is reported on its own item and never fails the whole batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(index: int, text: str) -> BatchResult:
+        async with semaphore:
+            try:
+                payload = await acreate_quiz_json(text, client, user_id=user_id)
+            except Exception as exc:
+                logger.warning("Batch quiz %d failed", index, exc_info=True)
+                return None, str(exc) or type(exc).__name__
+        return payload, None
+
+    return await asyncio.gather(
+        *(generate(index, text) for index, text in enumerate(texts))
+    )
+
+
+def encode_batch(results: list[BatchResult]) -> bytes:
+    """A serialized `BatchQuizResponse`, the quizzes are spliced in without a parse."""
+    items = [
+        b'{"index":%d,"quiz":%s,"error":%s}'
+        % (index, payload or b"null", json.dumps(error).encode())
+        for index, (payload, error) in enumerate(results)
+    ]
+    return b'{"results":[' + b",".join(items) + b"]}"
@@ -0,0 +1,114 @@
+import os
+import re
+
+# Input tokens a single upstream call may spend on the text, prompt excluded
+QUIZ_MAX_INPUT_TOKENS = int(os.getenv("QUIZ_MAX_INPUT_TOKENS", "20000"))
+# "reject" fails longer texts up front, "trim" keeps as much of their start as fits
+QUIZ_INPUT_OVERFLOW = os.getenv("QUIZ_INPUT_OVERFLOW", "reject")
+# Long documents are chunked instead, but never past this many tokens in total. More
+# than a single call takes, a text is never refused for asking to be chunked
+QUIZ_MAX_DOCUMENT_TOKENS = int(
+    os.getenv("QUIZ_MAX_DOCUMENT_TOKENS", str(4 * QUIZ_MAX_INPUT_TOKENS))
+)
+if QUIZ_MAX_DOCUMENT_TOKENS <= QUIZ_MAX_INPUT_TOKENS:
+    raise ValueError("QUIZ_MAX_DOCUMENT_TOKENS must exceed QUIZ_MAX_INPUT_TOKENS")
+# Output budget: a question and its four options stay well under this, plus the wrapper
+QUIZ_OUTPUT_TOKENS_PER_QUESTION = int(
+    os.getenv("QUIZ_OUTPUT_TOKENS_PER_QUESTION", "200")
+)
+QUIZ_OUTPUT_TOKENS_BASE = int(os.getenv("QUIZ_OUTPUT_TOKENS_BASE", "64"))
+
+_HORIZONTAL_SPACE = re.compile(r"[^\S\n]+")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Where a trimmed text may end, the separator is kept up to its first character
+_BOUNDARIES = ("\n\n", "\n", ". ", " ")
+
+
+class InputTooLarge(Exception):
+    def __init__(self, tokens: int, limit: int) -> None:
+        super().__init__(f"Text is about {tokens} tokens, the limit is {limit} tokens")
+        self.tokens = tokens
+        self.limit = limit
+
+
+def estimate_tokens(text: str) -> int:
+    """Rounded up estimate of the tokens of `text`, without a tokenizer.
+
+    About four characters per token for ASCII text, plus one per extra UTF-8 byte
+    of the other characters, which tokenize much less densely.
+    """
+    tokens = (len(text) + 3) // 4
+    if not text.isascii():
+        tokens += len(text.encode()) - len(text)
+    return tokens
+
+
+def max_output_tokens(num_questions: int) -> int:
+    return QUIZ_OUTPUT_TOKENS_BASE + num_questions * QUIZ_OUTPUT_TOKENS_PER_QUESTION
+
+
+def normalize_text(text: str) -> str:
+    """Collapses runs of whitespace and drops paragraphs already seen in the text."""
+    seen: set[str] = set()
+    paragraphs = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        lines = _HORIZONTAL_SPACE.sub(" ", paragraph).split("\n")
+        paragraph = "\n".join(line.strip() for line in lines).strip()
+        if paragraph and paragraph not in seen:
+            seen.add(paragraph)
+            paragraphs.append(paragraph)
+    return "\n\n".join(paragraphs)
+
+
+def trim_to_budget(text: str, max_tokens: int) -> str:
+    """The longest start of `text` within `max_tokens`, ended on a paragraph,
+    line, sentence or word when that keeps at least half of it."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # The estimate only grows with the prefix, bisect the longest one that fits
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = text[:low]
+    for boundary in _BOUNDARIES:
+        cut = prefix.rfind(boundary)
+        if cut > low // 2:
+            return prefix[: cut + len(boundary.strip())]
+    return prefix
+
+
+def check_input_budget(text: str, max_tokens: int = QUIZ_MAX_INPUT_TOKENS) -> None:
+    """Raises `InputTooLarge` for a text that would be rejected, without preparing it."""
+    if QUIZ_INPUT_OVERFLOW == "reject":
+        _check_tokens(text, max_tokens)
+
+
+def check_document_budget(
+    text: str, max_tokens: int = QUIZ_MAX_DOCUMENT_TOKENS
+) -> None:
+    """Raises `InputTooLarge` for a long document over the ceiling, even when trimming."""
+    _check_tokens(text, max_tokens)
+
+
+def _check_tokens(text: str, max_tokens: int) -> None:
+    if estimate_tokens(text) <= max_tokens:
+        return
+    # Normalizing only ever shrinks the text, so it is skipped when the raw one fits
+    tokens = estimate_tokens(normalize_text(text))
+    if tokens > max_tokens:
+        raise InputTooLarge(tokens, max_tokens)
+
+
+def prepare_input(text: str, max_tokens: int = QUIZ_MAX_INPUT_TOKENS) -> str:
+    """The text as sent upstream: normalized, then rejected or trimmed if too long."""
+    text = normalize_text(text)
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if QUIZ_INPUT_OVERFLOW == "trim":
+        return trim_to_budget(text, max_tokens)
+    raise InputTooLarge(tokens, max_tokens)
@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import os
+
+from pydantic_core import to_json
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.cache import TTLCache
+from src.database import AsyncSessionLocal, SessionLocal
+from src.quiz.models.cache import QuizCacheEntry
+from src.quiz.models.quiz import QuizResponse
+from src.shared_cache import SharedMemoryCache
+
+QUIZ_CACHE_SIZE = int(os.getenv("QUIZ_CACHE_SIZE", "1024"))
+QUIZ_CACHE_TTL_SECONDS = int(os.getenv("QUIZ_CACHE_TTL_SECONDS", "3600"))
+QUIZ_CACHE_PERSISTENT = os.getenv("QUIZ_CACHE_PERSISTENT", "true").lower() == "true"
+# File shared by the workers of a host, e.g. /dev/shm/quiz-cache, unset disables it
+QUIZ_SHARED_CACHE_PATH = os.getenv("QUIZ_SHARED_CACHE_PATH")
+QUIZ_SHARED_CACHE_SLOTS = int(os.getenv("QUIZ_SHARED_CACHE_SLOTS", "4096"))
+# Quizzes serialized larger than this minus a 40 bytes header skip the shared tier
+QUIZ_SHARED_CACHE_SLOT_BYTES = int(os.getenv("QUIZ_SHARED_CACHE_SLOT_BYTES", "8192"))
+
+logger = logging.getLogger("uvicorn")
+
+
+def make_cache_key(
+    text: str, *, model: str, prompt_version: int, max_tokens: int, num_questions: int
+) -> str:
+    """Content address of a quiz: the normalized text plus every generation setting."""
+    normalized = " ".join(text.split())
+    raw = f"{model}\0{prompt_version}\0{max_tokens}\0{num_questions}\0{normalized}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class QuizCache:
+    """Tiered quiz cache: an in-process LRU, a memory-mapped cache shared by the
+    workers of a host, then a Postgres table.
+
+    Entries are stored as serialized `QuizResponse` JSON, the `_json` methods
+    return it as is, ready to be sent. Database errors are logged and treated as
+    misses, a broken cache must never break generation.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = QUIZ_CACHE_SIZE,
+        ttl: float = QUIZ_CACHE_TTL_SECONDS,
+        session_factory: sessionmaker[Session] = SessionLocal,
+        async_session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        persistent: bool = QUIZ_CACHE_PERSISTENT,
+        shared: SharedMemoryCache | None = None,
+    ) -> None:
+        self.memory: TTLCache[str, bytes] = TTLCache(maxsize, ttl)
+        self.shared = shared
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.persistent = persistent
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> QuizResponse | None:
+        return _validated(self.get_json(key))
+
+    async def aget(self, key: str) -> QuizResponse | None:
+        return _validated(await self.aget_json(key))
+
+    def set(self, key: str, quiz: QuizResponse) -> None:
+        self.set_json(key, to_json(quiz))
+
+    async def aset(self, key: str, quiz: QuizResponse) -> None:
+        await self.aset_json(key, to_json(quiz))
+
+    def get_json(self, key: str) -> bytes | None:
+        payload = self._local(key)
+        if payload is None and self.persistent:
+            payload = self._promote(key, self._load(key))
+        return self._count(payload)
+
+    async def aget_json(self, key: str) -> bytes | None:
+        payload = self._local(key)
+        if payload is None and self.persistent:
+            payload = self._promote(key, await self._aload(key))
+        return self._count(payload)
+
+    def set_json(self, key: str, payload: bytes) -> None:
+        """`payload` must be a validated `QuizResponse`, it is served as is."""
+        self._set_local(key, payload)
+        if self.persistent:
+            self._store(key, payload.decode())
+
+    async def aset_json(self, key: str, payload: bytes) -> None:
+        self._set_local(key, payload)
+        if self.persistent:
+            await self._astore(key, payload.decode())
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        if self.shared is not None:
+            self.shared.close()
+
+    def stats(self) -> dict[str, int]:
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory.hits,
+            "persistent_hits": self.persistent_hits,
+            "memory_size": len(self.memory),
+        }
+        if self.shared is not None:
+            stats["shared_hits"] = self.shared.hits
+            stats["shared_size"] = len(self.shared)
+        return stats
+
+    def _local(self, key: str) -> bytes | None:
+        """Lookup in the tiers of this host, the shared one promotes to memory."""
+        payload = self.memory.get(key)
+        if payload is None and self.shared is not None:
+            payload = self.shared.get(key)
+            if payload is not None:
+                self.memory.set(key, payload)
+        return payload
+
+    def _set_local(self, key: str, payload: bytes) -> None:
+        self.memory.set(key, payload)
+        if self.shared is not None:
+            self.shared.set(key, payload)
+
+    def _promote(self, key: str, payload: str | None) -> bytes | None:
+        if payload is None:
+            return None
+        self.persistent_hits += 1
+        encoded = payload.encode()
+        self._set_local(key, encoded)
+        return encoded
+
+    def _count(self, payload: bytes | None) -> bytes | None:
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return payload
+
+    def _load(self, key: str) -> str | None:
+        db = self.session_factory()
+        try:
+            entry = db.get(QuizCacheEntry, key)
+            return entry.payload if entry is not None else None
+        except SQLAlchemyError:
+            logger.warning("Quiz cache lookup failed", exc_info=True)
+            return None
+        finally:
+            db.close()
+
+    def _store(self, key: str, payload: str) -> None:
+        db = self.session_factory()
+        try:
+            db.merge(QuizCacheEntry(key=key, payload=payload))
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.warning("Quiz cache write failed", exc_info=True)
+        finally:
+            db.close()
+
+    async def _aload(self, key: str) -> str | None:
+        try:
+            async with self.async_session_factory() as db:
+                entry = await db.get(QuizCacheEntry, key)
+                return entry.payload if entry is not None else None
+        except SQLAlchemyError:
+            logger.warning("Quiz cache lookup failed", exc_info=True)
+            return None
+
+    async def _astore(self, key: str, payload: str) -> None:
+        try:
+            async with self.async_session_factory() as db:
+                await db.merge(QuizCacheEntry(key=key, payload=payload))
+                await db.commit()
+        except SQLAlchemyError:
+            logger.warning("Quiz cache write failed", exc_info=True)
+
+
+def _validated(payload: bytes | None) -> QuizResponse | None:
+    return QuizResponse.model_validate_json(payload) if payload is not None else None
+
+
+quiz_cache = QuizCache(
+    shared=SharedMemoryCache(
+        QUIZ_SHARED_CACHE_PATH,
+        QUIZ_SHARED_CACHE_SLOTS,
+        QUIZ_SHARED_CACHE_SLOT_BYTES,
+        QUIZ_CACHE_TTL_SECONDS,
+    )
+    if QUIZ_SHARED_CACHE_PATH
+    else None
+)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import string
+from itertools import chain, zip_longest
+from typing import TYPE_CHECKING
+
+from pydantic_core import to_json
+
+from src.quiz.models.quiz import Quiz, QuizRequest, QuizResponse
+from src.quiz.services.budget import QUIZ_MAX_DOCUMENT_TOKENS, normalize_text
+from src.quiz.services.quiz import acreate_quiz, acreate_quiz_json
+
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+
+QUIZ_CHUNK_CHARS = int(os.getenv("QUIZ_CHUNK_CHARS", "4000"))
+QUIZ_CHUNK_CONCURRENCY = int(os.getenv("QUIZ_CHUNK_CONCURRENCY", "8"))
+# Upstream calls a long document within QUIZ_MAX_DOCUMENT_TOKENS may fan out to, each
+# costs a rate limit token. A token is at most four characters, and greedy packing
+# leaves any two consecutive chunks at least QUIZ_CHUNK_CHARS - 1 characters long
+QUIZ_MAX_CHUNKS = (
+    2 * math.ceil(4 * QUIZ_MAX_DOCUMENT_TOKENS / (QUIZ_CHUNK_CHARS - 1)) + 1
+)
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+logger = logging.getLogger("uvicorn")
+
+
+class TooManyChunks(Exception):
+    def __init__(self, chunks: int, limit: int) -> None:
+        super().__init__(f"Document splits into {chunks} chunks, the limit is {limit}")
+        self.chunks = chunks
+        self.limit = limit
+
+
+def _pack(pieces: list[str], max_chars: int, separator: str) -> list[str]:
+    """Greedily merge consecutive pieces while they fit in `max_chars`."""
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for piece in pieces:
+        if current and size + len(separator) + len(piece) > max_chars:
+            chunks.append(separator.join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + (len(separator) if size else 0)
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _split_paragraph(paragraph: str, max_chars: int) -> list[str]:
+    sentences: list[str] = []
+    for sentence in SENTENCE_END.split(paragraph):
+        # A single run-on sentence longer than a chunk is cut at the limit
+        sentences.extend(
+            sentence[i : i + max_chars] for i in range(0, len(sentence), max_chars)
+        )
+    return _pack(sentences, max_chars, " ")
+
+
+def split_text(text: str, max_chars: int = QUIZ_CHUNK_CHARS) -> list[str]:
+    """Split text in chunks of at most `max_chars`, on paragraph then sentence boundaries."""
+    pieces: list[str] = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(_split_paragraph(paragraph, max_chars))
+    return _pack(pieces, max_chars, "\n\n")
+
+
+def document_chunks(
+    text: str, max_chars: int = QUIZ_CHUNK_CHARS, max_chunks: int = QUIZ_MAX_CHUNKS
+) -> list[str]:
+    """The chunks a long document is generated from, or `TooManyChunks`."""
+    # Repeated paragraphs would be chunked and paid for twice
+    chunks = split_text(normalize_text(text), max_chars)
+    if len(chunks) > max_chunks:
+        raise TooManyChunks(len(chunks), max_chunks)
+    return chunks
+
+
+def _question_fingerprint(quiz: Quiz) -> str:
+    question = quiz.question.casefold().translate(
+        str.maketrans("", "", string.punctuation)
+    )
+    return " ".join(question.split())
+
+
+def select_quizzes(candidates: list[list[Quiz]], num_questions: int) -> list[Quiz]:
+    """Pick `num_questions` distinct questions, round-robin across chunks for coverage."""
+    selected: list[Quiz] = []
+    seen: set[str] = set()
+    for quiz in chain.from_iterable(zip_longest(*candidates)):
+        if quiz is None:
+            continue
+        fingerprint = _question_fingerprint(quiz)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        selected.append(quiz)
+        if len(selected) == num_questions:
+            break
+    return selected
+
+
+async def acreate_long_quiz(
+    text: str,
+    client: "AsyncAnthropic",
+    num_questions: int,
+    questions_per_chunk: int,
+    max_chars: int = QUIZ_CHUNK_CHARS,
+    concurrency: int = QUIZ_CHUNK_CONCURRENCY,
+    user_id: int | None = None,
+) -> QuizResponse:
+    """Map-reduce generation: candidate questions per chunk in parallel, then selection."""
+    chunks = document_chunks(text, max_chars)
+    if len(chunks) <= 1:
+        return await acreate_quiz(text, client, num_questions, user_id)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(chunk: str) -> QuizResponse:
+        async with semaphore:
+            return await acreate_quiz(chunk, client, questions_per_chunk, user_id)
+
+    results = await asyncio.gather(
+        *(generate(chunk) for chunk in chunks), return_exceptions=True
+    )
+
+    candidates: list[list[Quiz]] = []
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.warning("Quiz generation failed for a chunk", exc_info=result)
+        else:
+            candidates.append(result.quizzes)
+
+    if not candidates:
+        # Every chunk failed, surface the first error
+        raise next(r for r in results if isinstance(r, BaseException))
+
+    return QuizResponse(quizzes=select_quizzes(candidates, num_questions))
+
+
+async def agenerate_quiz(
+    req: QuizRequest, client: "AsyncAnthropic", user_id: int | None = None
+) -> QuizResponse:
+    if req.long_document:
+        return await acreate_long_quiz(
+            req.text,
+            client,
+            req.num_questions,
+            req.questions_per_chunk,
+            user_id=user_id,
+        )
+    return await acreate_quiz(req.text, client, req.num_questions, user_id)
+
+
+async def agenerate_quiz_json(
+    req: QuizRequest, client: "AsyncAnthropic", user_id: int | None = None
+) -> bytes:
+    """Like `agenerate_quiz`, serialized and ready to send."""
+    if req.long_document:
+        return to_json(await agenerate_quiz(req, client, user_id))
+    return await acreate_quiz_json(req.text, client, req.num_questions, user_id)
@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.database import AsyncSessionLocal
+from src.quiz.models.history import QuizHistory, QuizHistoryItem, QuizHistoryPage
+from src.quiz.models.quiz import QuizResponse
+
+QUIZ_HISTORY_FLUSH_INTERVAL_SECONDS = float(
+    os.getenv("QUIZ_HISTORY_FLUSH_INTERVAL_SECONDS", "1")
+)
+QUIZ_HISTORY_BATCH_SIZE = int(os.getenv("QUIZ_HISTORY_BATCH_SIZE", "500"))
+# Past this many unwritten entries the oldest are dropped
+QUIZ_HISTORY_MAX_PENDING = int(os.getenv("QUIZ_HISTORY_MAX_PENDING", "10000"))
+QUIZ_HISTORY_PAGE_SIZE = int(os.getenv("QUIZ_HISTORY_PAGE_SIZE", "20"))
+
+logger = logging.getLogger("uvicorn")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode()).hexdigest()
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = f"{created_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Raises ValueError on a malformed cursor."""
+    created_at, id = base64.urlsafe_b64decode(cursor).decode().split("|")
+    return datetime.fromisoformat(created_at), int(id)
+
+
+class HistoryWriter:
+    """Buffers generated quizzes and writes them in batches, off the request path.
+
+    `record` only appends to memory. A background task started in the lifespan
+    inserts the buffer every `flush_interval`, or sooner when `batch_size` is hit.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        flush_interval: float = QUIZ_HISTORY_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = QUIZ_HISTORY_BATCH_SIZE,
+        max_pending: int = QUIZ_HISTORY_MAX_PENDING,
+    ) -> None:
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def record(self, owner_id: int, text: str, quiz: QuizResponse | bytes) -> None:
+        """`quiz` may be serialized, it is then only decoded when written."""
+        row = {
+            "owner_id": owner_id,
+            "text_hash": text_hash(text),
+            "payload": quiz if isinstance(quiz, bytes) else quiz.model_dump(),
+            "created_at": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) > self.max_pending:
+                del self._pending[0]
+                self.dropped += 1
+            full = len(self._pending) >= self.batch_size
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._wakeup = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Write everything buffered so far, returns the number of rows written."""
+        written = 0
+        while batch := self._take():
+            batch = self._decode(batch)
+            if not batch:
+                continue
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(insert(QuizHistory), batch)
+                    await db.commit()
+            except Exception:
+                # Keep the batch for the next flush, `max_pending` bounds the backlog
+                logger.exception("Failed to write %d quiz history rows", len(batch))
+                self._requeue(batch)
+                break
+            written += len(batch)
+        return written
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self.dropped = 0
+
+    def _take(self) -> list[dict[str, Any]]:
+        with self._lock:
+            batch = self._pending[: self.batch_size]
+            del self._pending[: self.batch_size]
+        return batch
+
+    def _decode(self, batch: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Decodes serialized payloads, a row that is not valid JSON is dropped."""
+        decoded = []
+        for row in batch:
+            if isinstance(row["payload"], bytes):
+                try:
+                    row["payload"] = json.loads(row["payload"])
+                except ValueError:
+                    logger.exception("Dropping a quiz history row with invalid JSON")
+                    with self._lock:
+                        self.dropped += 1
+                    continue
+            decoded.append(row)
+        return decoded
+
+    def _requeue(self, batch: list[dict[str, Any]]) -> None:
+        with self._lock:
+            self._pending[:0] = batch
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Quiz history writer iteration failed")
+
+
+async def list_history(
+    db: AsyncSession,
+    owner_id: int,
+    limit: int = QUIZ_HISTORY_PAGE_SIZE,
+    after: tuple[datetime, int] | None = None,
+) -> QuizHistoryPage:
+    """One page of the user's history, newest first.
+
+    Keyset pagination on (created_at, id): every page is an index range scan
+    starting right after the previous one, however deep it is.
+    """
+    query = (
+        select(QuizHistory)
+        .where(QuizHistory.owner_id == owner_id)
+        .order_by(QuizHistory.created_at.desc(), QuizHistory.id.desc())
+        .limit(limit + 1)
+    )
+    if after is not None:
+        query = query.where(
+            tuple_(QuizHistory.created_at, QuizHistory.id) < tuple_(*after)
+        )
+
+    rows = list(await db.scalars(query))
+    next_cursor = None
+    if len(rows) > limit:
+        # rows[limit - 1], not rows[-1]: services are compiled with wraparound off
+        last = rows[limit - 1]
+        rows = rows[:limit]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return QuizHistoryPage(
+        items=[
+            QuizHistoryItem(
+                id=row.id,
+                text_hash=row.text_hash,
+                created_at=row.created_at,
+                quiz=QuizResponse.model_validate(row.payload),
+            )
+            for row in rows
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import os
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, cast
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import CursorResult, and_, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.database import SessionLocal
+from src.quiz.models.job import JobStatus, QuizJob
+from src.quiz.models.quiz import QuizRequest, QuizResponse
+from src.quiz.services.chunking import agenerate_quiz
+from src.quiz.services.history import history_writer
+from src.quiz.services.limits import UpstreamBusy
+
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+
+QUIZ_JOB_WORKERS = int(os.getenv("QUIZ_JOB_WORKERS", "2"))
+QUIZ_JOB_MAX_ATTEMPTS = int(os.getenv("QUIZ_JOB_MAX_ATTEMPTS", "5"))
+QUIZ_JOB_VISIBILITY_TIMEOUT_SECONDS = float(
+    os.getenv("QUIZ_JOB_VISIBILITY_TIMEOUT_SECONDS", "300")
+)
+QUIZ_JOB_RETRY_BASE_SECONDS = float(os.getenv("QUIZ_JOB_RETRY_BASE_SECONDS", "2"))
+QUIZ_JOB_POLL_INTERVAL_SECONDS = float(os.getenv("QUIZ_JOB_POLL_INTERVAL_SECONDS", "1"))
+
+logger = logging.getLogger("uvicorn")
+
+# Anthropic statuses worth retrying, every other 4xx fails the same way again
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429})
+
+
+def is_transient(exc: Exception) -> bool:
+    """Whether a failed job may succeed when retried, anything else fails it for good."""
+    from anthropic import APIConnectionError, APIStatusError
+
+    if isinstance(exc, (UpstreamBusy, APIConnectionError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES or exc.status_code >= 500
+    return False
+
+
+def enqueue_job(db: Session, owner_id: int, req: QuizRequest) -> QuizJob:
+    job = QuizJob(
+        owner_id=owner_id,
+        request=req.model_dump(),
+        run_at=datetime.now(timezone.utc),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: str, owner_id: int) -> QuizJob | None:
+    return db.scalars(
+        select(QuizJob).where(QuizJob.id == job_id, QuizJob.owner_id == owner_id)
+    ).first()
+
+
+def claim_job(
+    db: Session,
+    max_attempts: int = QUIZ_JOB_MAX_ATTEMPTS,
+    visibility_timeout: float = QUIZ_JOB_VISIBILITY_TIMEOUT_SECONDS,
+) -> tuple[str, int, int, dict[str, Any]] | None:
+    """Lease the oldest runnable job, returns its id, attempt number, owner and request.
+
+    Pending jobs whose backoff has elapsed are claimable, and so are running jobs
+    whose lease expired because their worker crashed. `SKIP LOCKED` lets many
+    workers poll concurrently without blocking on each other's rows.
+    """
+    while True:
+        now = datetime.now(timezone.utc)
+        job = db.scalars(
+            select(QuizJob)
+            .where(
+                or_(
+                    and_(QuizJob.status == JobStatus.PENDING, QuizJob.run_at <= now),
+                    and_(
+                        QuizJob.status == JobStatus.RUNNING,
+                        QuizJob.locked_until < now,
+                    ),
+                )
+            )
+            .order_by(QuizJob.run_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+
+        if job is None:
+            db.rollback()
+            return None
+
+        if job.attempts >= max_attempts:
+            # Its last worker died holding the lease, do not try again
+            job.status = JobStatus.FAILED
+            job.error = "Visibility timeout expired on the last attempt"
+            job.locked_until = None
+            db.commit()
+            continue
+
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        job.locked_until = now + timedelta(seconds=visibility_timeout)
+        claimed = (job.id, job.attempts, job.owner_id, job.request)
+        db.commit()
+        return claimed
+
+
+def complete_job(db: Session, job_id: str, attempt: int, quiz: QuizResponse) -> bool:
+    # The attempt number fences off a worker whose lease expired meanwhile
+    result = db.execute(
+        update(QuizJob)
+        .where(
+            QuizJob.id == job_id,
+            QuizJob.attempts == attempt,
+            QuizJob.status == JobStatus.RUNNING,
+        )
+        .values(
+            status=JobStatus.DONE,
+            result=quiz.model_dump(),
+            error=None,
+            locked_until=None,
+        )
+    )
+    db.commit()
+    return cast(CursorResult[Any], result).rowcount == 1
+
+
+def fail_job(
+    db: Session,
+    job_id: str,
+    attempt: int,
+    error: str,
+    max_attempts: int = QUIZ_JOB_MAX_ATTEMPTS,
+    retry_base: float = QUIZ_JOB_RETRY_BASE_SECONDS,
+    permanent: bool = False,
+) -> bool:
+    if permanent or attempt >= max_attempts:
+        values: dict[str, Any] = {"status": JobStatus.FAILED}
+    else:
+        # Exponential backoff: base, 2 * base, 4 * base, ...
+        delay = retry_base * 2 ** (attempt - 1)
+        values = {
+            "status": JobStatus.PENDING,
+            "run_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+        }
+
+    result = db.execute(
+        update(QuizJob)
+        .where(
+            QuizJob.id == job_id,
+            QuizJob.attempts == attempt,
+            QuizJob.status == JobStatus.RUNNING,
+        )
+        .values(error=error, locked_until=None, **values)
+    )
+    db.commit()
+    return cast(CursorResult[Any], result).rowcount == 1
+
+
+class QuizJobWorker:
+    """Pool of asyncio tasks that claim and run quiz jobs from the database."""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], "AsyncAnthropic"],
+        session_factory: sessionmaker[Session] = SessionLocal,
+        concurrency: int = QUIZ_JOB_WORKERS,
+        poll_interval: float = QUIZ_JOB_POLL_INTERVAL_SECONDS,
+        max_attempts: int = QUIZ_JOB_MAX_ATTEMPTS,
+        visibility_timeout: float = QUIZ_JOB_VISIBILITY_TIMEOUT_SECONDS,
+        retry_base: float = QUIZ_JOB_RETRY_BASE_SECONDS,
+    ) -> None:
+        self.client_factory = client_factory
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+        self.retry_base = retry_base
+        self._stopping = asyncio.Event()
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._tasks = [
+            asyncio.create_task(self._run()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        # Running jobs are abandoned, their lease expires and another worker retries them
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_once(self) -> bool:
+        """Claim and run a single job, returns False when the queue is empty."""
+        claimed = await run_in_threadpool(self._claim)
+        if claimed is None:
+            return False
+
+        job_id, attempt, owner_id, request = claimed
+        try:
+            quiz = await agenerate_quiz(
+                QuizRequest.model_validate(request), self.client_factory(), owner_id
+            )
+        except Exception as exc:
+            permanent = not is_transient(exc)
+            logger.warning(
+                "Quiz job %s attempt %d failed%s",
+                job_id,
+                attempt,
+                ", permanently" if permanent else "",
+            )
+            error = str(exc) or type(exc).__name__
+            await run_in_threadpool(self._fail, job_id, attempt, error, permanent)
+        else:
+            if await run_in_threadpool(self._complete, job_id, attempt, quiz):
+                history_writer.record(owner_id, request["text"], quiz)
+        return True
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                if await self.run_once():
+                    continue
+            except Exception:
+                logger.exception("Quiz job worker iteration failed")
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except TimeoutError:
+                pass
+
+    def _claim(self) -> tuple[str, int, int, dict[str, Any]] | None:
+        db = self.session_factory()
+        try:
+            return claim_job(db, self.max_attempts, self.visibility_timeout)
+        finally:
+            db.close()
+
+    def _complete(self, job_id: str, attempt: int, quiz: QuizResponse) -> bool:
+        db = self.session_factory()
+        try:
+            if not complete_job(db, job_id, attempt, quiz):
+                logger.warning("Quiz job %s lease was lost before completion", job_id)
+                return False
+            return True
+        finally:
+            db.close()
+
+    def _fail(self, job_id: str, attempt: int, error: str, permanent: bool) -> None:
+        db = self.session_factory()
+        try:
+            fail_job(
+                db,
+                job_id,
+                attempt,
+                error,
+                self.max_attempts,
+                self.retry_base,
+                permanent,
+            )
+        finally:
+            db.close()
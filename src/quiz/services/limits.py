@@ -0,0 +1,171 @@
+import math
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.database import AsyncSessionLocal
+from src.quiz.models.limits import RateLimitBucket
+
+QUIZ_RATE_LIMIT_PER_MINUTE = float(os.getenv("QUIZ_RATE_LIMIT_PER_MINUTE", "30"))
+QUIZ_RATE_LIMIT_BURST = float(os.getenv("QUIZ_RATE_LIMIT_BURST", "10"))
+# "memory" limits each worker on its own, "postgres" shares buckets across workers
+QUIZ_RATE_LIMIT_BACKEND = os.getenv("QUIZ_RATE_LIMIT_BACKEND", "memory")
+# Per worker process
+QUIZ_MAX_UPSTREAM_CONCURRENCY = int(os.getenv("QUIZ_MAX_UPSTREAM_CONCURRENCY", "64"))
+QUIZ_UPSTREAM_RETRY_AFTER_SECONDS = int(
+    os.getenv("QUIZ_UPSTREAM_RETRY_AFTER_SECONDS", "2")
+)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Rate limit exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class UpstreamBusy(Exception):
+    def __init__(self, retry_after: float = QUIZ_UPSTREAM_RETRY_AFTER_SECONDS) -> None:
+        super().__init__("Too many quiz generations in progress")
+        self.retry_after = retry_after
+
+
+def _refill(
+    tokens: float, updated_at: float, now: float, rate: float, burst: float
+) -> float:
+    return min(burst, tokens + (now - updated_at) * rate)
+
+
+def _take(tokens: float, cost: float, rate: float, burst: float) -> float:
+    """Returns the tokens left, or raises with the time until `cost` is available.
+
+    A cost larger than the burst is admitted once the bucket is full and leaves
+    it in debt, later requests wait until the whole cost has been refilled.
+    """
+    needed = min(cost, burst)
+    if tokens < needed:
+        raise RateLimited(retry_after=(needed - tokens) / rate)
+    return tokens - cost
+
+
+class TokenBucketLimiter:
+    """Per key token bucket: `burst` requests at once, refilled at `per_minute`."""
+
+    def __init__(
+        self,
+        per_minute: float = QUIZ_RATE_LIMIT_PER_MINUTE,
+        burst: float = QUIZ_RATE_LIMIT_BURST,
+    ) -> None:
+        self.rate = per_minute / 60
+        self.burst = burst
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, cost: float = 1) -> None:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = _refill(tokens, updated_at, now, self.rate, self.burst)
+            self._buckets[key] = (_take(tokens, cost, self.rate, self.burst), now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class PostgresTokenBucketLimiter:
+    """Same token bucket, stored in Postgres so every worker shares the budget.
+
+    The bucket row is locked with `SELECT ... FOR UPDATE` for the read-modify-write.
+    """
+
+    def __init__(
+        self,
+        per_minute: float = QUIZ_RATE_LIMIT_PER_MINUTE,
+        burst: float = QUIZ_RATE_LIMIT_BURST,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+    ) -> None:
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.session_factory = session_factory
+
+    async def acquire(self, key: str, cost: float = 1) -> None:
+        try:
+            await self._acquire(key, cost)
+        except IntegrityError:
+            # A concurrent first request inserted the row, it is locked and updated
+            # now. Any other database error is a server error, not a rate limit
+            await self._acquire(key, cost)
+
+    async def _acquire(self, key: str, cost: float) -> None:
+        now = time.time()
+        async with self.session_factory() as db:
+            bucket = await db.scalar(
+                select(RateLimitBucket)
+                .where(RateLimitBucket.key == key)
+                .with_for_update()
+            )
+            if bucket is None:
+                bucket = RateLimitBucket(key=key, tokens=self.burst, updated_at=now)
+                db.add(bucket)
+
+            tokens = _refill(
+                bucket.tokens, bucket.updated_at, now, self.rate, self.burst
+            )
+            try:
+                bucket.tokens = _take(tokens, cost, self.rate, self.burst)
+            except RateLimited:
+                await db.rollback()
+                raise
+            bucket.updated_at = now
+            await db.commit()
+
+    def clear(self) -> None:
+        pass
+
+
+class UpstreamLimiter:
+    """Caps concurrent upstream calls. Rejects immediately instead of queueing."""
+
+    def __init__(self, limit: int = QUIZ_MAX_UPSTREAM_CONCURRENCY) -> None:
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def check(self) -> None:
+        """Raises `UpstreamBusy` when a call started now would be rejected."""
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                raise UpstreamBusy
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                raise UpstreamBusy
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def retry_after_header(seconds: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+rate_limiter: TokenBucketLimiter | PostgresTokenBucketLimiter = (
+    PostgresTokenBucketLimiter()
+    if QUIZ_RATE_LIMIT_BACKEND == "postgres"
+    else TokenBucketLimiter()
+)
+upstream_limiter = UpstreamLimiter()
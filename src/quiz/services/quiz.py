@@ -1,40 +1,363 @@
-import json
-from typing import cast
+import os
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from functools import cache
+from typing import TYPE_CHECKING, Any, cast
 
-from anthropic import Anthropic
-from anthropic.types import TextBlock
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from prometheus_client import Counter, Histogram
+from pydantic_core import to_json
 
-from src.quiz.models.quiz import QuizResponse
+from src.quiz.models.quiz import Quiz, QuizResponse
+from src.quiz.services.budget import max_output_tokens, prepare_input
+from src.quiz.services.cache import make_cache_key, quiz_cache
+from src.quiz.services.limits import upstream_limiter
+from src.quiz.services.routing import MODEL, hedged, route_model
+from src.quiz.services.similarity import (
+    QUIZ_SIMILARITY_ENABLED,
+    Signature,
+    similarity_index,
+)
+from src.quiz.services.stream import QuizStreamParser
+from src.quiz.services.usage import usage_tracker
+from src.singleflight import AsyncSingleFlight, SingleFlight
 
-SYSTEM_PROMPT = """You are a quiz generator. Given a text, you must generate exactly 3 multiple-choice quiz questions based on its content.
+# anthropic takes over a second to import, it is only loaded on first use
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+    from anthropic.types import Message, TextBlock, Usage
+
+
+ANTHROPIC_MAX_CONNECTIONS = int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", "500"))
+ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS", "100")
+)
+ANTHROPIC_TIMEOUT_SECONDS = float(os.getenv("ANTHROPIC_TIMEOUT_SECONDS", "60"))
+ANTHROPIC_CONNECT_TIMEOUT_SECONDS = float(
+    os.getenv("ANTHROPIC_CONNECT_TIMEOUT_SECONDS", "5")
+)
+ANTHROPIC_MAX_RETRIES = int(os.getenv("ANTHROPIC_MAX_RETRIES", "2"))
+
+DEFAULT_NUM_QUESTIONS = 3
+
+# Bump whenever the prompt changes, so quizzes cached for the old prompt are not reused
+SYSTEM_PROMPT_VERSION = 1
+
+SYSTEM_PROMPT_TEMPLATE = """You are a quiz generator. Given a text, you must generate exactly {num_questions} multiple-choice quiz questions based on its content.
 
 Respond ONLY with a valid JSON object in this exact format, no other text:
-{
+{{
   "quizzes": [
-    {
+    {{
       "question": "The question text",
-      "a": {"text": "Option A", "correct": false},
-      "b": {"text": "Option B", "correct": true},
-      "c": {"text": "Option C", "correct": false},
-      "d": {"text": "Option D", "correct": false}
-    }
+      "a": {{"text": "Option A", "correct": false}},
+      "b": {{"text": "Option B", "correct": true}},
+      "c": {{"text": "Option C", "correct": false}},
+      "d": {{"text": "Option D", "correct": false}}
+    }}
   ]
-}
+}}
 
 Rules:
-- Generate exactly 3 questions
+- Generate exactly {num_questions} questions
 - Each question must have exactly 4 options (a, b, c, d)
 - Exactly one option per question must have "correct": true
 - All other options must have "correct": false"""
 
+SYSTEM_PROMPT = SYSTEM_PROMPT_TEMPLATE.format(num_questions=DEFAULT_NUM_QUESTIONS)
+
+
+@cache
+def system_prompt(num_questions: int) -> str:
+    return SYSTEM_PROMPT_TEMPLATE.format(num_questions=num_questions)
+
+
+ANTHROPIC_REQUEST_DURATION = Histogram(
+    "anthropic_request_duration_seconds",
+    "Latency of successful Anthropic calls, streams until their final message",
+    ["model", "mode"],
+    buckets=(0.5, 1, 2, 4, 8, 15, 30, 60, 120),
+)
+ANTHROPIC_TOKENS = Counter(
+    "anthropic_tokens", "Tokens billed by Anthropic", ["model", "kind"]
+)
+ANTHROPIC_ERRORS = Counter(
+    "anthropic_errors", "Failed Anthropic calls, after retries", ["model", "error"]
+)
+QUIZ_PARSE_FAILURES = Counter(
+    "quiz_parse_failures", "Model outputs that were not a valid quiz", ["model"]
+)
+
+
+class IncompleteQuiz(Exception):
+    """The model's answer was cut short or has fewer quizzes than requested."""
+
+
+# Identical requests in flight at the same time share a single upstream call
+quiz_flight: SingleFlight[str, QuizResponse] = SingleFlight()
+async_quiz_flight: AsyncSingleFlight[str, bytes] = AsyncSingleFlight()
+
+
+def quiz_cache_key(text: str, num_questions: int = DEFAULT_NUM_QUESTIONS) -> str:
+    # Keyed by the routed model, even when a hedge on another model answered
+    return make_cache_key(
+        text,
+        model=route_model(text),
+        prompt_version=SYSTEM_PROMPT_VERSION,
+        max_tokens=max_output_tokens(num_questions),
+        num_questions=num_questions,
+    )
+
+
+def quiz_namespace(
+    num_questions: int = DEFAULT_NUM_QUESTIONS, model: str = MODEL
+) -> str:
+    """Similarity namespace: near-duplicate texts only share quizzes made alike."""
+    max_tokens = max_output_tokens(num_questions)
+    return f"{model}:{SYSTEM_PROMPT_VERSION}:{max_tokens}:{num_questions}"
+
+
+def text_signature(text: str) -> Signature | None:
+    return similarity_index.signature(text) if QUIZ_SIMILARITY_ENABLED else None
+
+
+def _similar_key(
+    signature: Signature | None, num_questions: int, model: str
+) -> str | None:
+    if signature is None:
+        return None
+    return similarity_index.query(quiz_namespace(num_questions, model), signature)
+
+
+def _index(
+    key: str, signature: Signature | None, num_questions: int, model: str
+) -> None:
+    if signature is not None:
+        similarity_index.add(quiz_namespace(num_questions, model), key, signature)
+
+
+async def _atext_signature(text: str) -> Signature | None:
+    # Hashing every shingle of a long text would stall the event loop
+    if not QUIZ_SIMILARITY_ENABLED:
+        return None
+    return await run_in_threadpool(similarity_index.signature, text)
+
+
+def create_async_client() -> "AsyncAnthropic":
+    """Build the long-lived client shared by every request of this worker."""
+    import httpx
+    from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=ANTHROPIC_MAX_CONNECTIONS,
+            max_keepalive_connections=ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(
+            ANTHROPIC_TIMEOUT_SECONDS, connect=ANTHROPIC_CONNECT_TIMEOUT_SECONDS
+        ),
+    )
+    return AsyncAnthropic(http_client=http_client, max_retries=ANTHROPIC_MAX_RETRIES)
+
+
+def app_anthropic_client(app: FastAPI) -> "AsyncAnthropic":
+    """The worker's shared client, created on first use rather than at startup."""
+    client = getattr(app.state, "anthropic_client", None)
+    if client is None:
+        client = app.state.anthropic_client = create_async_client()
+    return client
+
+
+# Async so the client is created on the event loop, never twice from the threadpool
+async def get_anthropic_client(request: Request) -> "AsyncAnthropic":
+    return app_anthropic_client(request.app)
+
+
+def _message_params(text: str, num_questions: int, model: str) -> dict[str, Any]:
+    return {
+        "model": model,
+        "max_tokens": max_output_tokens(num_questions),
+        # The system prompt is identical across calls, let Anthropic cache its prefix
+        "system": [
+            {
+                "type": "text",
+                "text": system_prompt(num_questions),
+                "cache_control": {"type": "ephemeral"},
+            }
+        ],
+        "messages": [{"role": "user", "content": text}],
+    }
+
 
-def create_quiz(text: str) -> QuizResponse:
-    client = Anthropic()
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1024,
-        system=SYSTEM_PROMPT,
-        messages=[{"role": "user", "content": text}],
+@contextmanager
+def _upstream_call(model: str) -> Iterator[None]:
+    from anthropic import AnthropicError
+
+    with upstream_limiter.slot():
+        try:
+            yield
+        except AnthropicError as exc:
+            ANTHROPIC_ERRORS.labels(model, type(exc).__name__).inc()
+            raise
+
+
+def _record_usage(
+    usage: "Usage", started: float, user_id: int | None, mode: str, model: str
+) -> None:
+    latency = time.perf_counter() - started
+    usage_tracker.record(usage, latency, user_id)
+    ANTHROPIC_REQUEST_DURATION.labels(model, mode).observe(latency)
+    ANTHROPIC_TOKENS.labels(model, "input").inc(usage.input_tokens)
+    ANTHROPIC_TOKENS.labels(model, "output").inc(usage.output_tokens)
+    ANTHROPIC_TOKENS.labels(model, "cache_read").inc(usage.cache_read_input_tokens or 0)
+    ANTHROPIC_TOKENS.labels(model, "cache_creation").inc(
+        usage.cache_creation_input_tokens or 0
     )
-    data = json.loads(cast(TextBlock, message.content[0]).text)
-    return QuizResponse(**data)
+
+
+def _parse_message(message: "Message", model: str) -> QuizResponse:
+    try:
+        # Parsed and validated in one pass, straight from the model's text
+        return QuizResponse.model_validate_json(
+            cast("TextBlock", message.content[0]).text
+        )
+    except ValueError:
+        # Covers both invalid JSON and pydantic validation errors
+        QUIZ_PARSE_FAILURES.labels(model).inc()
+        raise
+
+
+def create_quiz(
+    text: str,
+    num_questions: int = DEFAULT_NUM_QUESTIONS,
+    user_id: int | None = None,
+) -> QuizResponse:
+    text = prepare_input(text)
+    key = quiz_cache_key(text, num_questions)
+    cached = quiz_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # A near-duplicate of an already generated text reuses its quiz
+    model = route_model(text)
+    signature = text_signature(text)
+    similar = _similar_key(signature, num_questions, model)
+    if similar is not None and (cached := quiz_cache.get(similar)) is not None:
+        return cached
+
+    def generate() -> QuizResponse:
+        from anthropic import Anthropic
+
+        client = Anthropic()
+        started = time.perf_counter()
+        with _upstream_call(model):
+            message = client.messages.create(
+                **_message_params(text, num_questions, model)
+            )
+        _record_usage(message.usage, started, user_id, "create", model)
+        quiz = _parse_message(message, model)
+        quiz_cache.set(key, quiz)
+        _index(key, signature, num_questions, model)
+        return quiz
+
+    return quiz_flight.do(key, generate)
+
+
+async def acreate_quiz_json(
+    text: str,
+    client: "AsyncAnthropic",
+    num_questions: int = DEFAULT_NUM_QUESTIONS,
+    user_id: int | None = None,
+) -> bytes:
+    """The quiz as serialized `QuizResponse` JSON, validated once and sent as is."""
+    text = prepare_input(text)
+    key = quiz_cache_key(text, num_questions)
+    cached = await quiz_cache.aget_json(key)
+    if cached is not None:
+        return cached
+
+    model = route_model(text)
+    signature = await _atext_signature(text)
+    similar = _similar_key(signature, num_questions, model)
+    if similar is not None:
+        cached = await quiz_cache.aget_json(similar)
+        if cached is not None:
+            return cached
+
+    # Usage is attributed to the user whose request started the shared call
+    async def call(model: str) -> bytes:
+        started = time.perf_counter()
+        with _upstream_call(model):
+            message = await client.messages.create(
+                **_message_params(text, num_questions, model)
+            )
+        _record_usage(message.usage, started, user_id, "create", model)
+        return to_json(_parse_message(message, model))
+
+    async def generate() -> bytes:
+        # A slow call gets a second one, the first to succeed is kept
+        payload = await hedged(call, model)
+        await quiz_cache.aset_json(key, payload)
+        _index(key, signature, num_questions, model)
+        return payload
+
+    return await async_quiz_flight.do(key, generate)
+
+
+async def acreate_quiz(
+    text: str,
+    client: "AsyncAnthropic",
+    num_questions: int = DEFAULT_NUM_QUESTIONS,
+    user_id: int | None = None,
+) -> QuizResponse:
+    payload = await acreate_quiz_json(text, client, num_questions, user_id)
+    return QuizResponse.model_validate_json(payload)
+
+
+async def astream_quiz(
+    text: str,
+    client: "AsyncAnthropic",
+    num_questions: int = DEFAULT_NUM_QUESTIONS,
+    user_id: int | None = None,
+) -> AsyncIterator[Quiz]:
+    """Yield each quiz as soon as the model has finished writing it."""
+    text = prepare_input(text)
+    key = quiz_cache_key(text, num_questions)
+    cached = await quiz_cache.aget(key)
+    model = route_model(text)
+    signature = None
+    if cached is None:
+        signature = await _atext_signature(text)
+        similar = _similar_key(signature, num_questions, model)
+        if similar is not None:
+            cached = await quiz_cache.aget(similar)
+    if cached is not None:
+        for quiz in cached.quizzes:
+            yield quiz
+        return
+
+    parser = QuizStreamParser()
+    started = time.perf_counter()
+    with _upstream_call(model):
+        async with client.messages.stream(
+            **_message_params(text, num_questions, model)
+        ) as stream:
+            async for chunk in stream.text_stream:
+                for quiz in parser.feed(chunk):
+                    yield quiz
+            message = await stream.get_final_message()
+    _record_usage(message.usage, started, user_id, "stream", model)
+
+    # The quizzes yielded so far may be a truncated answer, only a complete and
+    # valid one is cached, and the raised error keeps it out of the history
+    if message.stop_reason != "end_turn":
+        raise IncompleteQuiz(f"Quiz generation stopped early: {message.stop_reason}")
+    complete = _parse_message(message, model)
+    if len(complete.quizzes) != num_questions:
+        raise IncompleteQuiz(
+            f"Expected {num_questions} quizzes, got {len(complete.quizzes)}"
+        )
+    await quiz_cache.aset(key, complete)
+    _index(key, signature, num_questions, model)
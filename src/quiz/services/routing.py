@@ -0,0 +1,140 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from prometheus_client import Counter
+
+MODEL = os.getenv("QUIZ_MODEL", "claude-sonnet-4-20250514")
+# Comma separated max_chars=model, a text goes to the first route it fits in, else MODEL
+QUIZ_MODEL_ROUTES = os.getenv("QUIZ_MODEL_ROUTES", "")
+
+QUIZ_HEDGE_ENABLED = os.getenv("QUIZ_HEDGE_ENABLED", "true").lower() == "true"
+# A call still running at this percentile of its model's latency gets a second one
+QUIZ_HEDGE_PERCENTILE = float(os.getenv("QUIZ_HEDGE_PERCENTILE", "95"))
+# Model of the second call, empty for the same model as the first
+QUIZ_HEDGE_MODEL = os.getenv("QUIZ_HEDGE_MODEL", "")
+# Never hedge sooner, a fast spell would otherwise double every slightly slow call
+QUIZ_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("QUIZ_HEDGE_MIN_DELAY_SECONDS", "1"))
+# Calls observed per model before hedging starts, and the most recent ones kept
+QUIZ_HEDGE_MIN_SAMPLES = int(os.getenv("QUIZ_HEDGE_MIN_SAMPLES", "20"))
+QUIZ_LATENCY_WINDOW = int(os.getenv("QUIZ_LATENCY_WINDOW", "500"))
+
+ANTHROPIC_HEDGES = Counter(
+    "anthropic_hedges",
+    "Anthropic calls hedged with a second one, by the call that succeeded first",
+    ["model", "winner"],
+)
+
+R = TypeVar("R")
+
+
+def parse_routes(routes: str) -> list[tuple[int, str]]:
+    """`"2000=claude-haiku,8000=claude-sonnet"` as (max chars, model), shortest first."""
+    parsed = []
+    for route in filter(None, (r.strip() for r in routes.split(","))):
+        max_chars, model = route.split("=", 1)
+        parsed.append((int(max_chars), model.strip()))
+    return sorted(parsed)
+
+
+model_routes = parse_routes(QUIZ_MODEL_ROUTES)
+
+
+def route_model(text: str) -> str:
+    for max_chars, model in model_routes:
+        if len(text) <= max_chars:
+            return model
+    return MODEL
+
+
+class LatencyTracker:
+    """Recent latencies of the upstream calls, per model, for the hedge delays."""
+
+    def __init__(
+        self,
+        window: int = QUIZ_LATENCY_WINDOW,
+        min_samples: int = QUIZ_HEDGE_MIN_SAMPLES,
+    ) -> None:
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, model: str, percentile: float) -> float | None:
+        """None until `min_samples` calls of the model were observed."""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def hedge_delay(self, model: str) -> float | None:
+        latency = self.percentile(model, QUIZ_HEDGE_PERCENTILE)
+        if latency is None:
+            return None
+        return max(QUIZ_HEDGE_MIN_DELAY_SECONDS, latency)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+latency_tracker = LatencyTracker()
+
+
+async def _timed(call: Callable[[str], Awaitable[R]], model: str) -> R:
+    started = time.perf_counter()
+    try:
+        result = await call(model)
+    except asyncio.CancelledError:
+        # The call lost the race, it would have taken at least this long
+        latency_tracker.observe(model, time.perf_counter() - started)
+        raise
+    latency_tracker.observe(model, time.perf_counter() - started)
+    return result
+
+
+async def hedged(call: Callable[[str], Awaitable[R]], model: str) -> R:
+    """`call(model)`, plus `call(hedge model)` if the first is slower than usual.
+
+    The first call to succeed wins and the other one is cancelled. Errors are only
+    raised once both calls failed, those of the first call take precedence.
+    """
+    primary = asyncio.ensure_future(_timed(call, model))
+    tasks = [primary]
+    try:
+        delay = latency_tracker.hedge_delay(model) if QUIZ_HEDGE_ENABLED else None
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result()
+
+        backup = asyncio.ensure_future(_timed(call, QUIZ_HEDGE_MODEL or model))
+        tasks.append(backup)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    winner = "primary" if task is primary else "hedge"
+                    ANTHROPIC_HEDGES.labels(model, winner).inc()
+                    return task.result()
+        ANTHROPIC_HEDGES.labels(model, "none").inc()
+        return primary.result()
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,381 @@
+import fcntl
+import hashlib
+import logging
+import os
+import random
+import re
+import struct
+import threading
+import zlib
+from array import array
+from pathlib import Path
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, TypeAlias, TypeVar
+
+QUIZ_SIMILARITY_ENABLED = os.getenv("QUIZ_SIMILARITY_ENABLED", "true").lower() == "true"
+# Estimated Jaccard similarity of the word shingles above which a quiz is reused
+QUIZ_SIMILARITY_THRESHOLD = float(os.getenv("QUIZ_SIMILARITY_THRESHOLD", "0.8"))
+QUIZ_SIMILARITY_NUM_PERM = int(os.getenv("QUIZ_SIMILARITY_NUM_PERM", "64"))
+QUIZ_SIMILARITY_BANDS = int(os.getenv("QUIZ_SIMILARITY_BANDS", "16"))
+QUIZ_SIMILARITY_SHINGLE_SIZE = int(os.getenv("QUIZ_SIMILARITY_SHINGLE_SIZE", "3"))
+# Shorter texts only go through the exact cache, their similarity is too noisy
+QUIZ_SIMILARITY_MIN_WORDS = int(os.getenv("QUIZ_SIMILARITY_MIN_WORDS", "20"))
+# Past this many entries the oldest are evicted
+QUIZ_SIMILARITY_MAX_ENTRIES = int(os.getenv("QUIZ_SIMILARITY_MAX_ENTRIES", "100000"))
+# Append-only file the index is rebuilt from at startup, unset keeps it in memory
+QUIZ_SIMILARITY_INDEX_PATH = os.getenv("QUIZ_SIMILARITY_INDEX_PATH")
+
+logger = logging.getLogger("uvicorn")
+
+_WORD = re.compile(r"\w+")
+# Mersenne prime for the (a * x + b) mod p universal hashes
+_PRIME = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+_MAGIC = b"QMH1"
+_HEADER = struct.Struct("<4sHHH")
+_NAMESPACE_SIZE = 8
+_KEY_SIZE = 32
+_ENTRY_SIZE = _NAMESPACE_SIZE + _KEY_SIZE
+
+# Not a PEP 695 alias, Cython cannot compile them yet
+Signature: TypeAlias = array[int]
+R = TypeVar("R")
+
+
+def _namespace(namespace: str) -> bytes:
+    return hashlib.blake2b(namespace.encode(), digest_size=_NAMESPACE_SIZE).digest()
+
+
+def _band_hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class MinHashIndex:
+    """MinHash signatures of word shingles, bucketed with LSH banding.
+
+    Texts are lowercased and stripped of punctuation before shingling, so edits
+    to whitespace or punctuation do not change the signature at all. Lookups only
+    compare the few entries sharing a band with the query, independent of the
+    index size. Entries live in a namespace, quizzes generated with different
+    settings never match each other.
+
+    At most `max_entries` are kept, in a ring of slots stored in flat arrays: a
+    new entry overwrites the oldest one. A bucket maps a 64-bit band hash to a
+    slot, or to a list of them once several entries share the band.
+
+    The file is only touched by a single writer thread, so `add` never waits on
+    disk or on other processes. It is rewritten with the live entries once it
+    holds twice `max_entries` records.
+
+    Keys are sha256 hex digests, the quiz cache keys.
+    """
+
+    def __init__(
+        self,
+        threshold: float = QUIZ_SIMILARITY_THRESHOLD,
+        num_perm: int = QUIZ_SIMILARITY_NUM_PERM,
+        bands: int = QUIZ_SIMILARITY_BANDS,
+        shingle_size: int = QUIZ_SIMILARITY_SHINGLE_SIZE,
+        min_words: int = QUIZ_SIMILARITY_MIN_WORDS,
+        path: str | None = QUIZ_SIMILARITY_INDEX_PATH,
+        max_entries: int = QUIZ_SIMILARITY_MAX_ENTRIES,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        # Fixed seed: persisted signatures must stay comparable across restarts
+        rng = random.Random(0)
+        self._perms = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+            for _ in range(num_perm)
+        ]
+        self._record_size = _ENTRY_SIZE + 4 * num_perm
+        # Slot i is entries[i * _ENTRY_SIZE:], signatures[i * num_perm:] and
+        # band_hashes[i * bands:], the arrays only grow up to max_entries slots
+        self._entries = bytearray()
+        self._signatures: Signature = array("I")
+        self._band_hashes = array("Q")
+        self._buckets: dict[int, int | list[int]] = {}
+        self._size = 0
+        self._next = 0
+        self.hits = 0
+        # Owned by the writer thread
+        self._file: BinaryIO | None = None
+        self._file_records = 0
+        self._writer: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def signature(self, text: str) -> Signature | None:
+        """None when the text is too short to be compared reliably."""
+        words = _WORD.findall(text.lower())
+        if len(words) < max(self.min_words, 1):
+            return None
+        size = min(self.shingle_size, len(words))
+        hashes = {
+            zlib.crc32(" ".join(words[i : i + size]).encode())
+            for i in range(len(words) - size + 1)
+        }
+        return array(
+            "I",
+            (
+                min([(a * h + b) % _PRIME for h in hashes]) & _MASK
+                for a, b in self._perms
+            ),
+        )
+
+    def add(self, namespace: str, key: str, signature: Signature) -> None:
+        entry = _namespace(namespace) + bytes.fromhex(key)
+        band_hashes = self._band_hashes_of(entry, signature)
+        with self._lock:
+            inserted = self._insert(entry, signature, band_hashes)
+        if inserted and self.path is not None:
+            self._submit(self._append, entry + signature.tobytes())
+
+    def query(self, namespace: str, signature: Signature) -> str | None:
+        """Key of the most similar entry above the threshold, if any."""
+        ns = _namespace(namespace)
+        band_hashes = self._band_hashes_of(ns, signature)
+        with self._lock:
+            candidates = set()
+            for band_hash in band_hashes:
+                candidates.update(self._bucket(band_hash))
+            best, best_score = None, self.threshold
+            for slot in candidates:
+                offset = slot * self.num_perm
+                other = self._signatures[offset : offset + self.num_perm]
+                score = (
+                    sum(1 for x, y in zip(signature, other) if x == y) / self.num_perm
+                )
+                if score >= best_score:
+                    best, best_score = slot, score
+            if best is None:
+                return None
+            self.hits += 1
+            offset = best * _ENTRY_SIZE + _NAMESPACE_SIZE
+            return self._entries[offset : offset + _KEY_SIZE].hex()
+
+    def load(self) -> None:
+        """Rebuild the index from its file, a file written with other settings is reset.
+
+        The file is read without holding the index lock, so lookups keep being
+        served from the entries loaded so far while it runs in the background.
+        """
+        if self.path is None or not self.path.exists():
+            return
+        with self.path.open("rb") as f:
+            header = f.read(_HEADER.size)
+            if header != self._header():
+                logger.warning(
+                    "Similarity index %s is incompatible, resetting", self.path
+                )
+                self._submit(self._reset).result()
+                return
+            records = 0
+            while len(record := f.read(self._record_size)) == self._record_size:
+                entry = record[:_ENTRY_SIZE]
+                signature = array("I")
+                signature.frombytes(record[_ENTRY_SIZE:])
+                band_hashes = self._band_hashes_of(entry, signature)
+                with self._lock:
+                    self._insert(entry, signature, band_hashes)
+                records += 1
+        self._submit(self._loaded, records, bool(record)).result()
+        logger.info("Loaded %d entries into the similarity index", len(self))
+
+    def close(self) -> None:
+        """Waits for the pending writes, then closes the file."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.submit(self._close)
+            writer.shutdown()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            del self._signatures[:]
+            del self._band_hashes[:]
+            self._buckets.clear()
+            self._size = 0
+            self._next = 0
+            self.hits = 0
+
+    def _header(self) -> bytes:
+        return _HEADER.pack(_MAGIC, self.num_perm, self.bands, self.shingle_size)
+
+    def _band_hashes_of(self, entry: bytes, signature: Signature) -> list[int]:
+        ns = entry[:_NAMESPACE_SIZE]
+        return [
+            _band_hash(
+                ns
+                + band.to_bytes(2, "little")
+                + signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            )
+            for band in range(self.bands)
+        ]
+
+    def _bucket(self, band_hash: int) -> list[int]:
+        slots = self._buckets.get(band_hash, [])
+        return [slots] if isinstance(slots, int) else slots
+
+    def _insert(
+        self, entry: bytes, signature: Signature, band_hashes: list[int]
+    ) -> bool:
+        # The same key always comes with the same signature, so a duplicate shares
+        # every bucket with the original, the first one is enough to find it
+        for slot in self._bucket(band_hashes[0]):
+            offset = slot * _ENTRY_SIZE
+            if self._entries[offset : offset + _ENTRY_SIZE] == entry:
+                return False
+
+        slot = self._next
+        self._next = (slot + 1) % self.max_entries
+        if slot < self._size:
+            self._evict(slot)
+            offset = slot * self.num_perm
+            self._signatures[offset : offset + self.num_perm] = signature
+            offset = slot * self.bands
+            self._band_hashes[offset : offset + self.bands] = array("Q", band_hashes)
+            offset = slot * _ENTRY_SIZE
+            self._entries[offset : offset + _ENTRY_SIZE] = entry
+        else:
+            self._signatures.extend(signature)
+            self._band_hashes.extend(band_hashes)
+            self._entries += entry
+            self._size += 1
+
+        for band_hash in band_hashes:
+            slots = self._buckets.get(band_hash)
+            if slots is None:
+                self._buckets[band_hash] = slot
+            elif isinstance(slots, int):
+                self._buckets[band_hash] = [slots, slot]
+            else:
+                slots.append(slot)
+        return True
+
+    def _evict(self, slot: int) -> None:
+        offset = slot * self.bands
+        for band_hash in self._band_hashes[offset : offset + self.bands]:
+            slots = self._buckets[band_hash]
+            if isinstance(slots, int):
+                del self._buckets[band_hash]
+                continue
+            slots.remove(slot)
+            if len(slots) == 1:
+                self._buckets[band_hash] = slots[0]
+
+    def _submit(self, fn: Callable[..., R], *args: object) -> Future[R]:
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(1, "similarity-index")
+            return self._writer.submit(fn, *args)
+
+    # The methods below only run on the writer thread
+
+    def _append(self, record: bytes) -> None:
+        try:
+            f = self._locked_file()
+            try:
+                if f.tell() == 0:
+                    f.write(self._header())
+                f.write(record)
+                f.flush()
+                self._file_records += 1
+                if self._file_records >= 2 * self.max_entries:
+                    self._compact()
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+        except OSError:
+            # The in-memory index still works, the entry is just not persisted
+            logger.exception("Failed to persist similarity index entry")
+
+    def _loaded(self, records: int, torn: bool) -> None:
+        self._file_records = max(self._file_records, records)
+        if not torn:
+            return
+        # A record still being written by another process is complete once the
+        # lock is held, only what remains is a torn write from a crash
+        try:
+            f = self._locked_file()
+            try:
+                size = f.tell()
+                torn_bytes = max(0, size - _HEADER.size) % self._record_size
+                if torn_bytes:
+                    os.truncate(f.fileno(), size - torn_bytes)
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+        except OSError:
+            logger.exception("Failed to drop a torn similarity index record")
+
+    def _reset(self) -> None:
+        self._close()
+        assert self.path is not None
+        self.path.unlink(missing_ok=True)
+
+    def _locked_file(self) -> BinaryIO:
+        """The index file, exclusively locked across the processes appending to it."""
+        assert self.path is not None
+        while True:
+            if self._file is None:
+                self._file = self.path.open("ab")
+            fcntl.lockf(self._file, fcntl.LOCK_EX)
+            # Another process may have compacted the file while this one waited
+            try:
+                current = self.path.stat().st_ino
+            except FileNotFoundError:
+                current = None
+            if current == os.fstat(self._file.fileno()).st_ino:
+                self._file.seek(0, os.SEEK_END)
+                return self._file
+            fcntl.lockf(self._file, fcntl.LOCK_UN)
+            self._close()
+
+    def _compact(self) -> None:
+        """Rewrites the file with its last `max_entries` records, under the file lock."""
+        assert self.path is not None
+        with self.path.open("rb") as current:
+            if current.read(_HEADER.size) != self._header():
+                return
+            data = current.read()
+        records = len(data) // self._record_size
+        if records < 2 * self.max_entries:
+            # Another process compacted it already
+            self._file_records = records
+            return
+        start = (records - self.max_entries) * self._record_size
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("wb") as compacted:
+            compacted.write(self._header())
+            compacted.write(data[start : records * self._record_size])
+            compacted.flush()
+            os.fsync(compacted.fileno())
+        # Appenders waiting for the lock notice the new inode and reopen the file
+        os.replace(tmp, self.path)
+        self._file_records = self.max_entries
+        logger.info(
+            "Compacted the similarity index from %d to %d entries",
+            records,
+            self.max_entries,
+        )
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+similarity_index = MinHashIndex()
@@ -0,0 +1,51 @@
+from src.quiz.models.quiz import Quiz
+
+
+class QuizStreamParser:
+    """Incremental parser for the `{"quizzes": [...]}` document streamed by the model.
+
+    Text chunks are fed as they arrive and every quiz object is returned, validated,
+    as soon as its closing brace is seen. Only string and nesting state is tracked,
+    so each character is inspected exactly once.
+    """
+
+    def __init__(self) -> None:
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._current: list[str] = []
+
+    def feed(self, chunk: str) -> list[Quiz]:
+        completed: list[Quiz] = []
+
+        for char in chunk:
+            capturing = self._is_capturing()
+            if capturing:
+                self._current.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"' and self._stack:
+                self._in_string = True
+            elif char in "{[":
+                # A quiz starts at an object directly inside the root's array
+                if char == "{" and self._stack == ["{", "["]:
+                    self._current = [char]
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if capturing and not self._is_capturing():
+                    completed.append(Quiz.model_validate_json("".join(self._current)))
+                    self._current = []
+
+        return completed
+
+    def _is_capturing(self) -> bool:
+        return len(self._stack) >= 3 and self._stack[:2] == ["{", "["]
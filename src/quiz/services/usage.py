@@ -0,0 +1,47 @@
+import threading
+from typing import TYPE_CHECKING
+
+from src.quiz.models.usage import TokenUsage
+
+if TYPE_CHECKING:
+    from anthropic.types import Usage
+
+
+class UsageTracker:
+    """In-process aggregate of upstream token usage and latency, total and per user."""
+
+    def __init__(self) -> None:
+        self.total = TokenUsage()
+        self.per_user: dict[int, TokenUsage] = {}
+        self._lock = threading.Lock()
+
+    def record(self, usage: "Usage", latency: float, user_id: int | None) -> None:
+        with self._lock:
+            targets = [self.total]
+            if user_id is not None:
+                targets.append(self.per_user.setdefault(user_id, TokenUsage()))
+            for target in targets:
+                target.calls += 1
+                target.input_tokens += usage.input_tokens
+                target.cache_creation_input_tokens += (
+                    usage.cache_creation_input_tokens or 0
+                )
+                target.cache_read_input_tokens += usage.cache_read_input_tokens or 0
+                target.output_tokens += usage.output_tokens
+                target.latency_seconds += latency
+
+    def for_user(self, user_id: int) -> TokenUsage:
+        with self._lock:
+            return self.per_user.get(user_id, TokenUsage()).model_copy()
+
+    def snapshot(self) -> TokenUsage:
+        with self._lock:
+            return self.total.model_copy()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.total = TokenUsage()
+            self.per_user.clear()
+
+
+usage_tracker = UsageTracker()
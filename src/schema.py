@@ -0,0 +1,58 @@
+import logging
+import os
+
+from sqlalchemy import Engine, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from src.database import Base
+
+# Bump whenever a model change needs `python -m src.manage migrate` to run
+SCHEMA_VERSION = 2
+# Off in production, where the migration runs once before the workers start
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
+
+logger = logging.getLogger("uvicorn")
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    # Single row table
+    id: Mapped[int] = mapped_column(primary_key=True, default=1)
+    version: Mapped[int]
+
+
+def current_version(engine: Engine) -> int | None:
+    """Version the database was migrated to, None when it never was."""
+    try:
+        with Session(engine) as db:
+            return db.scalar(select(SchemaVersion.version).where(SchemaVersion.id == 1))
+    except SQLAlchemyError:
+        # The table itself does not exist yet
+        return None
+
+
+def migrate(engine: Engine) -> None:
+    """Create the missing tables and record the schema version.
+
+    Every model must be imported beforehand, so that it is registered on Base.
+    """
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.merge(SchemaVersion(id=1, version=SCHEMA_VERSION))
+        db.commit()
+    logger.info("Database schema migrated to version %d", SCHEMA_VERSION)
+
+
+def ensure_schema(engine: Engine, auto_migrate: bool = DB_AUTO_MIGRATE) -> None:
+    """Cheap check at startup, a single query when the schema is up to date."""
+    version = current_version(engine)
+    if version is not None and version >= SCHEMA_VERSION:
+        return
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {SCHEMA_VERSION}. "
+            "Run `python -m src.manage migrate` first."
+        )
+    migrate(engine)
@@ -0,0 +1,252 @@
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger("uvicorn")
+
+_MAGIC = b"QSC1"
+# magic, slots, slot size, ways, padded so the tags start cache line aligned
+_HEADER = struct.Struct("<4sIII48x")
+_TAG_SIZE = 16
+# key tag, expires at, last access, payload length, crc32 of tag + payload
+_SLOT = struct.Struct("<16sddII")
+_EXPIRES_AT = _TAG_SIZE
+_ACCESSED_AT = _TAG_SIZE + 8
+_DOUBLE = struct.Struct("<d")
+_EMPTY_TAG = bytes(_TAG_SIZE)
+
+
+class SharedMemoryCache:
+    """Fixed-size bytes cache in a memory-mapped file, shared by every process using it.
+
+    The file is a hash table of `slots` fixed-size slots, grouped in sets of `ways`
+    slots. A key can only live in its set, whose tags are contiguous, so a lookup
+    is a single search in `ways` * 16 bytes. A full set evicts its least recently
+    read entry, expired entries go first.
+
+    Writers lock their set, with a byte range lock across processes and a mutex
+    within one. Readers take no lock, an entry overwritten while being read fails
+    its checksum and counts as a miss. Values larger than a slot are not cached.
+
+    Keys are hex digests, like the quiz cache keys, their first 128 bits are the
+    tag. Put the file on a tmpfs like /dev/shm, so it lives in memory only.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        slots: int,
+        slot_size: int,
+        ttl: float,
+        ways: int = 8,
+    ) -> None:
+        if slots % ways:
+            raise ValueError("slots must be a multiple of ways")
+        if slot_size <= _SLOT.size:
+            raise ValueError(f"slot_size must be larger than {_SLOT.size}")
+        self.path = Path(path)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ttl = ttl
+        self.ways = ways
+        self.sets = slots // ways
+        self.capacity = slot_size - _SLOT.size
+        self.hits = 0
+        self.misses = 0
+        self.oversize = 0
+        self._slots_start = _HEADER.size + slots * _TAG_SIZE
+        self._fd: int | None = None
+        self._map: mmap.mmap | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def size_bytes(self) -> int:
+        return self._slots_start + self.slots * self.slot_size
+
+    def get(self, key: str) -> bytes | None:
+        m = self._mapped()
+        tag = bytes.fromhex(key[: 2 * _TAG_SIZE])
+        slot = self._find(m, self._first_slot(tag), tag)
+        if slot is not None:
+            offset = self._slot_offset(slot)
+            slot_tag, expires_at, _, length, crc = _SLOT.unpack_from(m, offset)
+            now = time.time()
+            if slot_tag == tag and expires_at > now:
+                start = offset + _SLOT.size
+                value = m[start : start + min(length, self.capacity)]
+                if zlib.crc32(value, zlib.crc32(tag)) == crc:
+                    # Unlocked, a lost update only makes the LRU order less exact
+                    _DOUBLE.pack_into(m, offset + _ACCESSED_AT, now)
+                    self.hits += 1
+                    return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes) -> bool:
+        """False when the value does not fit in a slot."""
+        if len(value) > self.capacity:
+            self.oversize += 1
+            return False
+        m = self._mapped()
+        tag = bytes.fromhex(key[: 2 * _TAG_SIZE])
+        first = self._first_slot(tag)
+        now = time.time()
+        with self._locked(self._tag_offset(first), self.ways * _TAG_SIZE):
+            slot = self._find(m, first, tag)
+            if slot is None:
+                slot = self._victim(m, first, now)
+            tag_offset = self._tag_offset(slot)
+            offset = self._slot_offset(slot)
+            # Untagged while written, readers never pair the key with half a value
+            m[tag_offset : tag_offset + _TAG_SIZE] = _EMPTY_TAG
+            start = offset + _SLOT.size
+            m[start : start + len(value)] = value
+            crc = zlib.crc32(value, zlib.crc32(tag))
+            _SLOT.pack_into(m, offset, tag, now + self.ttl, now, len(value), crc)
+            m[tag_offset : tag_offset + _TAG_SIZE] = tag
+        return True
+
+    def clear(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.oversize = 0
+        if self._map is None and not self.path.exists():
+            return
+        m = self._mapped()
+        tags = self.slots * _TAG_SIZE
+        with self._locked(_HEADER.size, tags):
+            m[_HEADER.size : self._slots_start] = bytes(tags)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __len__(self) -> int:
+        m = self._map
+        if m is None:
+            return 0
+        now = time.time()
+        return sum(
+            1
+            for slot in range(self.slots)
+            if self._tag(m, slot) != _EMPTY_TAG
+            and _DOUBLE.unpack_from(m, self._slot_offset(slot) + _EXPIRES_AT)[0] > now
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "oversize": self.oversize,
+            "size": len(self),
+            "slots": self.slots,
+        }
+
+    def _first_slot(self, tag: bytes) -> int:
+        return int.from_bytes(tag[:8], "little") % self.sets * self.ways
+
+    def _tag_offset(self, slot: int) -> int:
+        return _HEADER.size + slot * _TAG_SIZE
+
+    def _slot_offset(self, slot: int) -> int:
+        return self._slots_start + slot * self.slot_size
+
+    def _tag(self, m: mmap.mmap, slot: int) -> bytes:
+        offset = self._tag_offset(slot)
+        return m[offset : offset + _TAG_SIZE]
+
+    def _find(self, m: mmap.mmap, first: int, tag: bytes) -> int | None:
+        start = self._tag_offset(first)
+        tags = m[start : start + self.ways * _TAG_SIZE]
+        index = tags.find(tag)
+        # A match straddling two tags is not one
+        while index > 0 and index % _TAG_SIZE:
+            index = tags.find(tag, index + 1)
+        return None if index < 0 else first + index // _TAG_SIZE
+
+    def _victim(self, m: mmap.mmap, first: int, now: float) -> int:
+        """An empty or expired slot of the set, else its least recently read one."""
+        victim, oldest = first, float("inf")
+        for slot in range(first, first + self.ways):
+            if self._tag(m, slot) == _EMPTY_TAG:
+                return slot
+            _, expires_at, accessed_at, _, _ = _SLOT.unpack_from(
+                m, self._slot_offset(slot)
+            )
+            if expires_at <= now:
+                return slot
+            if accessed_at < oldest:
+                victim, oldest = slot, accessed_at
+        return victim
+
+    @contextmanager
+    def _locked(self, start: int, length: int) -> Iterator[None]:
+        # fcntl locks are per process, the mutex serializes this process' threads
+        with self._lock:
+            fd = self._fd
+            # Callers map the file first, which opens it
+            assert fd is not None
+            fcntl.lockf(fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, length, start)
+
+    def _mapped(self) -> mmap.mmap:
+        # Opened on first use, so every worker maps the file after forking
+        if self._map is not None:
+            return self._map
+        with self._lock:
+            if self._map is None:
+                self._fd, self._map = self._open()
+        return self._map
+
+    def _open(self) -> tuple[int, mmap.mmap]:
+        header = _HEADER.pack(_MAGIC, self.slots, self.slot_size, self.ways)
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            mapped = None
+            # Whole file lock: only one worker creates or replaces it
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                stat = os.fstat(fd)
+                # Else replaced by another worker in the meantime, open the new one
+                if self._is_current(stat):
+                    if stat.st_size == 0:
+                        os.ftruncate(fd, self.size_bytes)
+                        os.pwrite(fd, header, 0)
+                    if os.pread(fd, _HEADER.size, 0) == header:
+                        mapped = mmap.mmap(fd, self.size_bytes)
+                    else:
+                        # Unlinked rather than truncated, workers still mapping the
+                        # old layout would crash on a shrunk file
+                        logger.warning(
+                            "Shared cache %s has another layout, replacing it",
+                            self.path,
+                        )
+                        self.path.unlink()
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+                if mapped is None:
+                    os.close(fd)
+            if mapped is not None:
+                return fd, mapped
+
+    def _is_current(self, stat: os.stat_result) -> bool:
+        try:
+            return os.stat(self.path).st_ino == stat.st_ino
+        except FileNotFoundError:
+            return False
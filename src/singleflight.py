@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from concurrent.futures import Future
+
+
+class SingleFlight[K: Hashable, V]:
+    """Coalesces concurrent calls with the same key into a single execution.
+
+    For threaded callers: the first caller runs `func`, the others block until it
+    finishes and receive the same result or exception.
+    """
+
+    def __init__(self) -> None:
+        self.shared = 0
+        self._calls: dict[K, Future[V]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: K, func: Callable[[], V]) -> V:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if future is None:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class _Flight[V]:
+    def __init__(self, task: asyncio.Task[V]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight[K: Hashable, V]:
+    """Coalesces concurrent coroutines with the same key into a single task.
+
+    Every caller awaits the shared task through `asyncio.shield`, so a caller
+    being cancelled never cancels the work for the others. The task itself is
+    only cancelled once every caller has gone away.
+    """
+
+    def __init__(self) -> None:
+        self.shared = 0
+        self._flights: dict[K, _Flight[V]] = {}
+
+    async def do(self, key: K, func: Callable[[], Awaitable[V]]) -> V:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(func()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.shared += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody wants the result anymore, new callers start a fresh flight
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: K, flight: _Flight[V]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -1,21 +1,44 @@
-from collections.abc import Generator
+import tempfile
+from collections.abc import AsyncGenerator, Generator
+from pathlib import Path
 
 import pytest
+from anthropic import AsyncAnthropic
 from fastapi.testclient import TestClient
-from sqlalchemy import StaticPool, create_engine
+from sqlalchemy import NullPool, create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from src.auth.middleware import JWTAuthMiddleware
-from src.database import Base, get_db
+from src.auth.services.auth import user_cache
+from src.auth.services.revocation import revocation_list
+from src.database import Base, get_async_db, get_db
 from src.main import app
+from src.quiz.services.cache import quiz_cache
+from src.quiz.services.history import history_writer
+from src.quiz.services.limits import rate_limiter
+from src.quiz.services.quiz import get_anthropic_client
+from src.quiz.services.routing import latency_tracker
+from src.quiz.services.similarity import similarity_index
+from src.quiz.services.usage import usage_tracker
+
+# A file database, so the sync and async engines see the same tables and rows
+TEST_DB_PATH = Path(tempfile.mkdtemp()) / "test.db"
 
 engine = create_engine(
-    "sqlite://",
+    f"sqlite:///{TEST_DB_PATH}",
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient runs every request in a fresh event loop, connections must not be reused
+async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{TEST_DB_PATH}", poolclass=NullPool
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 @pytest.fixture(autouse=True)
 def setup_db() -> Generator[None, None, None]:
@@ -32,15 +55,44 @@ def override_get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def override_get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+
+# The shared Anthropic client is created in the lifespan, which TestClient skips
+test_anthropic_client = AsyncAnthropic(api_key="fake-key")
+app.dependency_overrides[get_anthropic_client] = lambda: test_anthropic_client
 
 # The JWT middleware creates its own DB sessions, so we override its factory too
 for _m in app.user_middleware:
     if _m.cls is JWTAuthMiddleware:
-        _m.kwargs["session_factory"] = TestingSessionLocal  # ty: ignore[invalid-assignment]
+        _m.kwargs["session_factory"] = TestingAsyncSessionLocal  # ty: ignore[invalid-assignment]
         break
 app.middleware_stack = None
 
+# Same for both tiers of the quiz cache, the revocation list and the history writer
+quiz_cache.session_factory = TestingSessionLocal
+quiz_cache.async_session_factory = TestingAsyncSessionLocal
+revocation_list.session_factory = TestingAsyncSessionLocal
+history_writer.session_factory = TestingAsyncSessionLocal
+
+
+@pytest.fixture(autouse=True)
+def clear_caches() -> Generator[None, None, None]:
+    yield
+    quiz_cache.clear()
+    user_cache.clear()
+    revocation_list.clear()
+    usage_tracker.clear()
+    rate_limiter.clear()
+    history_writer.clear()
+    similarity_index.clear()
+    latency_tracker.clear()
+
 
 @pytest.fixture
 def client() -> TestClient:
@@ -1,4 +1,19 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from unittest.mock import patch
+
+import bcrypt
 from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import select
+
+from src.auth.models.refresh import RefreshToken
+from src.auth.models.user import User
+from src.auth.services.auth import user_cache
+from src.auth.services.passwords import PasswordHasher, password_hasher
+from src.auth.services.revocation import RevocationList, revocation_list
+from tests.conftest import TestingAsyncSessionLocal, TestingSessionLocal
 
 
 def test_signup(client: TestClient) -> None:
@@ -52,3 +67,215 @@ def test_me_no_token(client: TestClient) -> None:
 def test_me_invalid_token(client: TestClient) -> None:
     resp = client.get("/auth/me", headers={"Authorization": "Bearer garbage"})
     assert resp.status_code == 401
+
+
+@patch("src.metrics.METRICS_TOKEN", "scrape-token")
+def test_me_user_lookup_is_cached(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    user_cache.clear()
+    client.get("/auth/me", headers=auth_headers)
+    client.get("/auth/me", headers=auth_headers)
+
+    resp = client.get("/auth/cache/stats", headers=auth_headers)
+    assert resp.status_code == 401
+    scraper = {"Authorization": "Bearer scrape-token"}
+    stats = client.get("/auth/cache/stats", headers=scraper).json()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+
+def test_signup_invalidates_cached_user(client: TestClient) -> None:
+    stale = User(id=999, username="alice", hashed_password="x")
+    user_cache.set("alice", stale)
+
+    client.post("/auth/signup", json={"username": "alice", "password": "pass123"})
+
+    assert user_cache.get("alice") is None
+
+
+def test_login_upgrades_outdated_hash(client: TestClient) -> None:
+    client.post("/auth/signup", json={"username": "alice", "password": "pass123"})
+    old_hash = bcrypt.hashpw(b"pass123", bcrypt.gensalt(5)).decode()
+    with TestingSessionLocal() as db:
+        db.query(User).filter(User.username == "alice").update(
+            {"hashed_password": old_hash}
+        )
+        db.commit()
+
+    resp = client.post("/auth/login", json={"username": "alice", "password": "pass123"})
+    assert resp.status_code == 200
+
+    with TestingSessionLocal() as db:
+        user = db.query(User).filter(User.username == "alice").one()
+        assert user.hashed_password != old_hash
+        assert not password_hasher.needs_rehash(user.hashed_password)
+    resp = client.post("/auth/login", json={"username": "alice", "password": "pass123"})
+    assert resp.status_code == 200
+
+
+def test_login_rejected_fast_when_hasher_saturated(client: TestClient) -> None:
+    client.post("/auth/signup", json={"username": "alice", "password": "pass123"})
+
+    with patch.object(password_hasher, "max_pending", 0):
+        resp = client.post(
+            "/auth/login", json={"username": "alice", "password": "pass123"}
+        )
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+
+
+def test_password_hasher_inline_mode() -> None:
+    hasher = PasswordHasher(workers=0, rounds=4)
+    hashed = hasher.hash("secret")
+    assert hasher.verify("secret", hashed)
+    assert not hasher.verify("other", hashed)
+    assert PasswordHasher(workers=0, rounds=5).needs_rehash(hashed)
+
+
+def test_logout_revokes_token(client: TestClient, auth_headers: dict[str, str]) -> None:
+    resp = client.post("/auth/logout", headers=auth_headers)
+    assert resp.status_code == 204
+
+    resp = client.get("/auth/me", headers=auth_headers)
+    assert resp.status_code == 401
+    assert resp.json()["detail"] == "Token has been revoked"
+
+
+def test_revocation_is_loaded_from_database(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    client.post("/auth/logout", headers=auth_headers)
+    # Another worker only knows about the revocation through the table
+    revocation_list.clear()
+
+    resp = client.get("/auth/me", headers=auth_headers)
+    assert resp.status_code == 401
+
+
+def test_checks_wait_for_the_first_revocation_load() -> None:
+    revocations = RevocationList(TestingAsyncSessionLocal)
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    async def run() -> list[bool]:
+        async with TestingAsyncSessionLocal() as db:
+            await RevocationList(TestingAsyncSessionLocal).revoke(
+                db, "revoked", expires_at
+            )
+        return await asyncio.gather(
+            *(revocations.is_revoked("revoked") for _ in range(3))
+        )
+
+    assert asyncio.run(run()) == [True, True, True]
+
+
+def test_reload_keeps_revocations_made_meanwhile() -> None:
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    class LateRevocationSession:
+        """The snapshot is taken, then this worker revokes a token, then it lands."""
+
+        def __init__(self) -> None:
+            self.db = TestingAsyncSessionLocal()
+
+        async def __aenter__(self) -> "LateRevocationSession":
+            return self
+
+        async def __aexit__(self, *exc: object) -> None:
+            await self.db.close()
+
+        async def scalars(self, query: Any) -> Any:
+            snapshot = list(await self.db.scalars(query))
+            async with TestingAsyncSessionLocal() as db:
+                await revocations.revoke(db, "late", expires_at)
+            return snapshot
+
+    revocations = RevocationList(LateRevocationSession)  # ty: ignore[invalid-argument-type]
+
+    assert asyncio.run(revocations.is_revoked("late"))
+
+
+@patch("src.auth.middleware.AUTH_STATELESS_TOKENS", True)
+@patch("src.auth.services.auth.AUTH_STATELESS_TOKENS", True)
+def test_stateless_token_skips_user_lookup(client: TestClient) -> None:
+    client.post("/auth/signup", json={"username": "alice", "password": "pass123"})
+    token = client.post(
+        "/auth/login", json={"username": "alice", "password": "pass123"}
+    ).json()["access_token"]
+    assert jwt.get_unverified_claims(token)["uid"] == 1
+
+    user_cache.clear()
+    resp = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert resp.status_code == 200
+    assert resp.json() == {"id": 1, "username": "alice"}
+    assert user_cache.stats()["misses"] == 0
+
+
+def _login(client: TestClient) -> dict[str, str]:
+    client.post("/auth/signup", json={"username": "alice", "password": "pass123"})
+    resp = client.post("/auth/login", json={"username": "alice", "password": "pass123"})
+    return resp.json()
+
+
+def test_refresh_rotates_tokens_without_a_password(client: TestClient) -> None:
+    tokens = _login(client)
+
+    with patch.object(password_hasher, "averify") as verify:
+        resp = client.post(
+            "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+    verify.assert_not_called()
+
+    assert resp.status_code == 200
+    rotated = resp.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+    assert client.get("/auth/me", headers=headers).json()["username"] == "alice"
+    # Only hashes are stored
+    with TestingSessionLocal() as db:
+        stored = set(db.scalars(select(RefreshToken.token_hash)))
+    assert len(stored) == 2
+    assert tokens["refresh_token"] not in stored
+
+
+def test_reused_refresh_token_revokes_its_family(client: TestClient) -> None:
+    tokens = _login(client)
+    other_session = client.post(
+        "/auth/login", json={"username": "alice", "password": "pass123"}
+    ).json()
+    rotated = client.post(
+        "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    ).json()
+
+    # The first token leaked and is replayed, the legitimate client is cut off too
+    resp = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert resp.status_code == 401
+    resp = client.post(
+        "/auth/refresh", json={"refresh_token": rotated["refresh_token"]}
+    )
+    assert resp.status_code == 401
+
+    resp = client.post(
+        "/auth/refresh", json={"refresh_token": other_session["refresh_token"]}
+    )
+    assert resp.status_code == 200
+
+
+def test_expired_or_unknown_refresh_token_is_rejected(client: TestClient) -> None:
+    with patch("src.auth.services.refresh.REFRESH_TOKEN_EXPIRE_DAYS", -1):
+        tokens = _login(client)
+
+    for token in (tokens["refresh_token"], "not-a-token"):
+        resp = client.post("/auth/refresh", json={"refresh_token": token})
+        assert resp.status_code == 401
+
+
+def test_logout_revokes_the_session_refresh_token(client: TestClient) -> None:
+    tokens = _login(client)
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    client.post("/auth/logout", headers=headers)
+
+    resp = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert resp.status_code == 401
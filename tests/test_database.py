@@ -0,0 +1,28 @@
+from sqlalchemy import make_url
+
+from src.database import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    _pool_options,
+    async_database_url,
+)
+
+
+def test_async_database_url_picks_async_driver() -> None:
+    url = async_database_url(make_url("postgresql://user:pass@db:5432/app"))
+    assert url.drivername == "postgresql+asyncpg"
+    assert url.database == "app"
+
+    url = async_database_url(make_url("postgresql+psycopg2://user:pass@db/app"))
+    assert url.drivername == "postgresql+asyncpg"
+
+    assert async_database_url(make_url("sqlite://")).drivername == "sqlite+aiosqlite"
+
+
+def test_pool_options_only_for_server_databases() -> None:
+    assert _pool_options(make_url("sqlite://")) == {}
+
+    options = _pool_options(make_url("postgresql://user:pass@db/app"))
+    assert options["pool_size"] == DB_POOL_SIZE
+    assert options["max_overflow"] == DB_MAX_OVERFLOW
+    assert options["pool_pre_ping"] is True
@@ -0,0 +1,100 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from src.metrics import instrument_engine
+from src.quiz.services.quiz import MODEL, acreate_quiz
+from tests.test_quiz import _mock_message
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@patch("src.metrics.METRICS_TOKEN", "scrape-token")
+def test_metrics_endpoint_needs_its_token_and_labels_route_templates(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    before = _sample(
+        "http_request_duration_seconds_count",
+        method="GET",
+        route="/quiz/jobs/{job_id}",
+        status="404",
+    )
+    client.get("/quiz/jobs/some-id", headers=auth_headers)
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=auth_headers).status_code == 401
+    resp = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+
+    assert resp.status_code == 200
+    assert 'route="/quiz/jobs/{job_id}"' in resp.text
+    after = _sample(
+        "http_request_duration_seconds_count",
+        method="GET",
+        route="/quiz/jobs/{job_id}",
+        status="404",
+    )
+    assert after == before + 1
+
+
+def test_auth_outcomes_are_counted(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    outcomes = ["authenticated", "missing_header", "invalid_token"]
+    before = {o: _sample("auth_requests_total", outcome=o) for o in outcomes}
+
+    client.get("/auth/me", headers=auth_headers)
+    client.get("/auth/me")
+    client.get("/auth/me", headers={"Authorization": "Bearer not-a-jwt"})
+
+    for outcome in outcomes:
+        assert _sample("auth_requests_total", outcome=outcome) == before[outcome] + 1
+
+
+def test_anthropic_tokens_and_parse_failures_are_counted() -> None:
+    client = MagicMock()
+    client.messages.create = AsyncMock(return_value=_mock_message())
+    tokens = _sample("anthropic_tokens_total", model=MODEL, kind="cache_read")
+    calls = _sample(
+        "anthropic_request_duration_seconds_count", model=MODEL, mode="create"
+    )
+
+    asyncio.run(acreate_quiz("Some text about Python", client))
+
+    assert _sample("anthropic_tokens_total", model=MODEL, kind="cache_read") == (
+        tokens + 300
+    )
+    assert (
+        _sample("anthropic_request_duration_seconds_count", model=MODEL, mode="create")
+        == calls + 1
+    )
+
+    failures = _sample("quiz_parse_failures_total", model=MODEL)
+    broken = _mock_message()
+    broken.content[0].text = json.dumps({"quizzes": "nope"})
+    client.messages.create = AsyncMock(return_value=broken)
+    with pytest.raises(ValueError):
+        asyncio.run(acreate_quiz("Other text", client))
+    assert _sample("quiz_parse_failures_total", model=MODEL) == failures + 1
+
+
+def test_metrics_are_not_served_without_a_token(client: TestClient) -> None:
+    assert client.get("/metrics").status_code == 404
+
+
+def test_instrumented_engine_records_checkouts() -> None:
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "test")
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert _sample("db_connections_checked_out", engine="test") == 1
+
+    assert _sample("db_connections_checked_out", engine="test") == 0
+    assert _sample("db_connection_held_seconds_count", engine="test") == 1
@@ -1,8 +1,24 @@
-from unittest.mock import patch
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
+from anthropic.types import Usage
 from fastapi.testclient import TestClient
 
-from src.quiz.models.quiz import QuizResponse
+from src.quiz.models.quiz import BatchQuizItem, BatchQuizResponse, Quiz, QuizResponse
+from src.quiz.services.batch import acreate_quiz_batch, encode_batch
+from src.quiz.services.cache import quiz_cache
+from src.quiz.services.chunking import acreate_long_quiz, split_text
+from src.quiz.services.quiz import (
+    IncompleteQuiz,
+    acreate_quiz,
+    astream_quiz,
+    create_quiz,
+)
+from src.quiz.services.stream import QuizStreamParser
+from src.quiz.services.usage import usage_tracker
 
 MOCK_RESPONSE = {
     "quizzes": [
@@ -29,13 +45,14 @@ MOCK_RESPONSE = {
         },
     ]
 }
+MOCK_PAYLOAD = QuizResponse.model_validate(MOCK_RESPONSE).model_dump_json().encode()
 
 
-@patch("src.quiz.router.create_quiz")
+@patch("src.quiz.router.agenerate_quiz_json")
 def test_generate_quiz(
     mock_create_quiz, client: TestClient, auth_headers: dict[str, str]
 ) -> None:
-    mock_create_quiz.return_value = QuizResponse.model_validate(MOCK_RESPONSE)
+    mock_create_quiz.return_value = MOCK_PAYLOAD
 
     resp = client.post(
         "/quiz/", json={"text": "Some text about Python"}, headers=auth_headers
@@ -46,11 +63,11 @@ def test_generate_quiz(
     assert data["quizzes"][0]["question"] == "What is Python?"
 
 
-@patch("src.quiz.router.create_quiz")
+@patch("src.quiz.router.agenerate_quiz_json")
 def test_generate_quiz_empty_text(
     mock_create_quiz, client: TestClient, auth_headers: dict[str, str]
 ) -> None:
-    mock_create_quiz.return_value = QuizResponse.model_validate(MOCK_RESPONSE)
+    mock_create_quiz.return_value = MOCK_PAYLOAD
     resp = client.post("/quiz/", json={"text": ""}, headers=auth_headers)
     assert resp.status_code == 200
 
@@ -65,3 +82,334 @@ def test_generate_quiz_missing_body(
 ) -> None:
     resp = client.post("/quiz/", headers=auth_headers)
     assert resp.status_code == 422
+
+
+def _mock_message() -> MagicMock:
+    message = MagicMock()
+    message.content = [MagicMock(text=json.dumps(MOCK_RESPONSE))]
+    message.stop_reason = "end_turn"
+    message.usage = Usage(
+        input_tokens=40,
+        cache_read_input_tokens=300,
+        cache_creation_input_tokens=0,
+        output_tokens=250,
+    )
+    return message
+
+
+def _mock_anthropic(mock_anthropic_cls) -> MagicMock:
+    client = mock_anthropic_cls.return_value
+    client.messages.create.return_value = _mock_message()
+    return client
+
+
+@patch("anthropic.Anthropic")
+def test_create_quiz_cache_hit_skips_llm(mock_anthropic_cls) -> None:
+    client = _mock_anthropic(mock_anthropic_cls)
+
+    first = create_quiz("Some text about Python")
+    second = create_quiz("  Some text\nabout   Python ")
+
+    assert first == second
+    assert client.messages.create.call_count == 1
+    stats = quiz_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+@patch("anthropic.Anthropic")
+def test_create_quiz_persistent_cache(mock_anthropic_cls) -> None:
+    client = _mock_anthropic(mock_anthropic_cls)
+
+    create_quiz("Some text about Python")
+    quiz_cache.memory.clear()
+    quiz = create_quiz("Some text about Python")
+
+    assert quiz.quizzes[0].question == "What is Python?"
+    assert client.messages.create.call_count == 1
+    assert quiz_cache.stats()["persistent_hits"] == 1
+
+
+def test_acreate_quiz_uses_shared_client() -> None:
+    client = MagicMock()
+    client.messages.create = AsyncMock(return_value=_mock_message())
+
+    first = asyncio.run(acreate_quiz("Some text about Python", client))
+    second = asyncio.run(acreate_quiz("Some text about Python", client))
+
+    assert first == second
+    assert first.quizzes[1].question == "What is 2+2?"
+    client.messages.create.assert_awaited_once()
+
+
+def test_acreate_quiz_caches_prompt_and_records_usage() -> None:
+    client = MagicMock()
+    client.messages.create = AsyncMock(return_value=_mock_message())
+
+    asyncio.run(acreate_quiz("Some text about Python", client, user_id=7))
+
+    await_args = client.messages.create.await_args
+    assert await_args is not None
+    system = await_args.kwargs["system"]
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    usage = usage_tracker.for_user(7)
+    assert usage.calls == 1
+    assert usage.input_tokens == 40
+    assert usage.cache_read_input_tokens == 300
+    assert usage.output_tokens == 250
+    assert usage.latency_seconds > 0
+    assert usage_tracker.for_user(8).calls == 0
+
+
+def test_read_usage(client: TestClient, auth_headers: dict[str, str]) -> None:
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    usage_tracker.record(_mock_message().usage, 1.5, user_id)
+    usage_tracker.record(_mock_message().usage, 0.5, None)
+
+    resp = client.get("/quiz/usage", headers=auth_headers)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["calls"] == 1
+    assert data["latency_seconds"] == 1.5
+    assert data["output_tokens"] == 250
+
+
+def test_identical_concurrent_requests_share_upstream_call() -> None:
+    async def slow_create(**kwargs) -> MagicMock:
+        await asyncio.sleep(0.01)
+        return _mock_message()
+
+    client = MagicMock()
+    client.messages.create = AsyncMock(side_effect=slow_create)
+
+    async def main() -> list[QuizResponse]:
+        return await asyncio.gather(
+            *(acreate_quiz("Same lesson", client, user_id=i) for i in range(10))
+        )
+
+    quizzes = asyncio.run(main())
+    assert all(quiz == quizzes[0] for quiz in quizzes)
+    client.messages.create.assert_awaited_once()
+
+
+@patch("src.metrics.METRICS_TOKEN", "scrape-token")
+def test_cache_stats_need_the_metrics_token(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    resp = client.get("/quiz/cache/stats", headers=auth_headers)
+    assert resp.status_code == 401
+
+    scraper = {"Authorization": "Bearer scrape-token"}
+    resp = client.get("/quiz/cache/stats", headers=scraper)
+    assert resp.status_code == 200
+    assert resp.json()["hits"] == 0
+
+
+def test_stream_parser_emits_each_quiz_when_complete() -> None:
+    raw = json.dumps(MOCK_RESPONSE, indent=2)
+    parser = QuizStreamParser()
+
+    emitted = []
+    for i in range(0, len(raw), 7):
+        emitted.append(parser.feed(raw[i : i + 7]))
+
+    quizzes = [quiz for batch in emitted for quiz in batch]
+    assert quizzes == QuizResponse.model_validate(MOCK_RESPONSE).quizzes
+    # The first quiz is available long before the document is complete
+    first_index = next(i for i, batch in enumerate(emitted) if batch)
+    assert first_index < len(emitted) // 2
+
+
+def test_stream_parser_ignores_braces_in_strings() -> None:
+    quiz = dict(MOCK_RESPONSE["quizzes"][0], question='What does "{[" mean?')
+    parser = QuizStreamParser()
+    quizzes = parser.feed(json.dumps({"quizzes": [quiz]}))
+    assert [q.question for q in quizzes] == ['What does "{[" mean?']
+
+
+@patch("src.quiz.router.astream_quiz")
+def test_stream_quiz(
+    mock_stream_quiz, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    async def fake_stream(text, client, num_questions, user_id) -> AsyncIterator[Quiz]:
+        for quiz in QuizResponse.model_validate(MOCK_RESPONSE).quizzes:
+            yield quiz
+
+    mock_stream_quiz.side_effect = fake_stream
+
+    resp = client.post(
+        "/quiz/stream", json={"text": "Some text about Python"}, headers=auth_headers
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["question"] for line in lines] == [
+        "What is Python?",
+        "What is 2+2?",
+        "What is HTTP?",
+    ]
+
+
+def _streaming_client(text: str, stop_reason: str) -> MagicMock:
+    message = _mock_message()
+    message.content = [MagicMock(text=text)]
+    message.stop_reason = stop_reason
+
+    async def text_stream() -> AsyncIterator[str]:
+        yield text
+
+    stream = MagicMock(text_stream=text_stream())
+    stream.get_final_message = AsyncMock(return_value=message)
+    client = MagicMock()
+    client.messages.stream.return_value.__aenter__ = AsyncMock(return_value=stream)
+    client.messages.stream.return_value.__aexit__ = AsyncMock(return_value=None)
+    client.messages.create = AsyncMock(return_value=_mock_message())
+    return client
+
+
+def test_truncated_stream_is_not_cached() -> None:
+    # Cut off by max_tokens after the first quiz
+    truncated = json.dumps(MOCK_RESPONSE)[:400]
+    client = _streaming_client(truncated, "max_tokens")
+
+    async def consume() -> list[Quiz]:
+        quizzes = []
+        with pytest.raises(IncompleteQuiz):
+            async for quiz in astream_quiz("Some text about Python", client):
+                quizzes.append(quiz)
+        return quizzes
+
+    assert len(asyncio.run(consume())) == 1
+
+    quiz = asyncio.run(acreate_quiz("Some text about Python", client))
+    assert len(quiz.quizzes) == 3
+    client.messages.create.assert_awaited_once()
+
+
+def test_stream_with_fewer_quizzes_than_requested_is_not_cached() -> None:
+    short = json.dumps({"quizzes": MOCK_RESPONSE["quizzes"][:2]})
+    client = _streaming_client(short, "end_turn")
+
+    async def consume() -> None:
+        async for _ in astream_quiz("Some text about Python", client):
+            pass
+
+    with pytest.raises(IncompleteQuiz):
+        asyncio.run(consume())
+    asyncio.run(acreate_quiz("Some text about Python", client))
+    client.messages.create.assert_awaited_once()
+
+
+def test_complete_stream_is_cached() -> None:
+    client = _streaming_client(json.dumps(MOCK_RESPONSE), "end_turn")
+
+    async def consume() -> list[Quiz]:
+        return [quiz async for quiz in astream_quiz("Some text about Python", client)]
+
+    assert len(asyncio.run(consume())) == 3
+    asyncio.run(acreate_quiz("Some text about Python", client))
+    client.messages.create.assert_not_awaited()
+
+
+@patch("src.quiz.services.batch.acreate_quiz_json")
+def test_generate_quiz_batch_reports_partial_failures(
+    mock_acreate_quiz, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    async def fake_create(text, client, user_id) -> bytes:
+        if text == "bad":
+            raise ValueError("Invalid model output")
+        return MOCK_PAYLOAD
+
+    mock_acreate_quiz.side_effect = fake_create
+
+    resp = client.post(
+        "/quiz/batch", json={"texts": ["good", "bad", "good"]}, headers=auth_headers
+    )
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert results[0]["quiz"]["quizzes"][0]["question"] == "What is Python?"
+    assert results[1]["quiz"] is None
+    assert results[1]["error"] == "Invalid model output"
+    assert results[2]["error"] is None
+
+
+@patch("src.quiz.services.batch.acreate_quiz_json")
+def test_quiz_batch_bounds_concurrency(mock_acreate_quiz) -> None:
+    in_flight = 0
+    peak = 0
+
+    async def fake_create(text, client, user_id) -> bytes:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return MOCK_PAYLOAD
+
+    mock_acreate_quiz.side_effect = fake_create
+
+    results = asyncio.run(acreate_quiz_batch(["text"] * 10, MagicMock(), 3))
+    assert len(results) == 10
+    assert peak == 3
+
+
+def test_encode_batch_matches_the_response_model() -> None:
+    encoded = encode_batch([(MOCK_PAYLOAD, None), (None, 'Invalid "output"')])
+
+    expected = BatchQuizResponse(
+        results=[
+            BatchQuizItem(index=0, quiz=QuizResponse.model_validate(MOCK_RESPONSE)),
+            BatchQuizItem(index=1, error='Invalid "output"'),
+        ]
+    )
+    assert encoded == expected.model_dump_json().encode()
+
+
+def test_split_text_respects_paragraphs_and_sentences() -> None:
+    paragraphs = ["First paragraph. " * 5, "Second paragraph. " * 5, "Short."]
+    text = "\n\n".join(p.strip() for p in paragraphs)
+
+    chunks = split_text(text, max_chars=100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert chunks[0] == paragraphs[0].strip()
+    assert chunks[-1].endswith("Second paragraph.\n\nShort.")
+    # Nothing is lost apart from the whitespace at the boundaries
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace(
+        "\n", ""
+    ).replace(" ", "")
+
+
+def test_split_text_cuts_long_sentences() -> None:
+    chunks = split_text("x" * 250, max_chars=100)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+
+@patch("src.quiz.services.chunking.acreate_quiz")
+def test_long_quiz_maps_chunks_and_deduplicates(mock_acreate_quiz) -> None:
+    quizzes = QuizResponse.model_validate(MOCK_RESPONSE).quizzes
+
+    async def fake_create(text, client, num_questions, user_id) -> QuizResponse:
+        assert num_questions == 2
+        if text.startswith("Chapter one"):
+            return QuizResponse(quizzes=[quizzes[0], quizzes[1]])
+        # Same first question as chapter one, only differing by case and punctuation
+        duplicate = quizzes[0].model_copy(update={"question": "what is python"})
+        return QuizResponse(quizzes=[duplicate, quizzes[2]])
+
+    mock_acreate_quiz.side_effect = fake_create
+    text = "Chapter one. " * 20 + "\n\n" + "Chapter two. " * 20
+
+    quiz = asyncio.run(
+        acreate_long_quiz(
+            text, MagicMock(), num_questions=3, questions_per_chunk=2, max_chars=300
+        )
+    )
+
+    assert mock_acreate_quiz.await_count == 2
+    assert [q.question for q in quiz.quizzes] == [
+        "What is Python?",
+        "What is 2+2?",
+        "What is HTTP?",
+    ]
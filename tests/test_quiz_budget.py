@@ -0,0 +1,121 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.quiz.services.budget import (
+    QUIZ_MAX_DOCUMENT_TOKENS,
+    QUIZ_MAX_INPUT_TOKENS,
+    InputTooLarge,
+    estimate_tokens,
+    normalize_text,
+    prepare_input,
+    trim_to_budget,
+)
+from src.quiz.services.chunking import QUIZ_CHUNK_CHARS, TooManyChunks, document_chunks
+from src.quiz.services.limits import TokenBucketLimiter
+from src.quiz.services.quiz import acreate_quiz
+from tests.test_quiz import MOCK_PAYLOAD, _mock_message
+
+TOO_LARGE = "word " * QUIZ_MAX_INPUT_TOKENS
+
+
+def test_estimate_counts_non_ascii_text_denser() -> None:
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 400) == 100
+    assert estimate_tokens("é" * 400) == 500
+    assert estimate_tokens("珊瑚礁" * 100) == 675
+
+
+def test_normalize_collapses_whitespace_and_repeated_paragraphs() -> None:
+    text = (
+        "  First \t paragraph\n  goes on.  \n\n\n Second.\n \nFirst paragraph\ngoes on."
+    )
+    assert normalize_text(text) == "First paragraph\ngoes on.\n\nSecond."
+
+
+def test_trim_ends_on_the_last_sentence_that_fits() -> None:
+    text = "One sentence here. " * 40
+    trimmed = trim_to_budget(text, 50)
+
+    assert estimate_tokens(trimmed) <= 50
+    assert trimmed.endswith("here.")
+    assert text.startswith(trimmed)
+    assert trim_to_budget(text, 50) == trimmed
+    assert trim_to_budget("short", 50) == "short"
+
+
+def test_over_budget_input_is_rejected_or_trimmed() -> None:
+    with pytest.raises(InputTooLarge):
+        prepare_input("Paragraph.\n\n" + "x " * 500, max_tokens=100)
+    # Repeated paragraphs are dropped before the budget applies
+    assert (
+        prepare_input("Same paragraph.\n\n" * 500, max_tokens=10) == "Same paragraph."
+    )
+
+    with patch("src.quiz.services.budget.QUIZ_INPUT_OVERFLOW", "trim"):
+        trimmed = prepare_input("Paragraph.\n\n" + "x " * 500, max_tokens=100)
+    assert trimmed.startswith("Paragraph.\n\nx x")
+    assert estimate_tokens(trimmed) <= 100
+
+
+def test_max_tokens_follows_the_question_count() -> None:
+    client = MagicMock()
+    client.messages.create = AsyncMock(return_value=_mock_message())
+
+    asyncio.run(acreate_quiz("Text", client, num_questions=1))
+    asyncio.run(acreate_quiz("Text", client, num_questions=10))
+
+    first, second = client.messages.create.await_args_list
+    assert first.kwargs["max_tokens"] < 1024 < second.kwargs["max_tokens"]
+
+
+@patch("src.quiz.router.agenerate_quiz_json")
+def test_too_large_text_is_rejected_before_any_work(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    for path in ("/quiz/", "/quiz/stream", "/quiz/jobs"):
+        resp = client.post(path, json={"text": TOO_LARGE}, headers=auth_headers)
+        assert resp.status_code == 413
+        assert "limit" in resp.json()["detail"]
+    mock_generate.assert_not_awaited()
+
+
+@patch("src.quiz.router.agenerate_quiz_json")
+def test_text_a_single_call_takes_can_be_chunked(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_generate.return_value = MOCK_PAYLOAD
+    # Paragraphs just over half a chunk pack worst, one per chunk
+    paragraph = "x" * (QUIZ_CHUNK_CHARS // 2 + 1)
+    count = 4 * QUIZ_MAX_INPUT_TOKENS // (len(paragraph) + 2)
+    text = "\n\n".join(f"{i:04d}{paragraph}" for i in range(count))
+    assert estimate_tokens(text) <= QUIZ_MAX_INPUT_TOKENS
+    assert len(document_chunks(text)) == count
+
+    with patch("src.quiz.router.rate_limiter", TokenBucketLimiter(60, burst=1000)):
+        for long_document in (False, True):
+            resp = client.post(
+                "/quiz/",
+                json={"text": text, "long_document": long_document},
+                headers=auth_headers,
+            )
+            assert resp.status_code == 200
+
+
+def test_document_chunks_are_capped() -> None:
+    with pytest.raises(TooManyChunks):
+        document_chunks("First.\n\nSecond.\n\nThird.", max_chars=8, max_chunks=2)
+
+
+@patch("src.quiz.router.document_chunks")
+def test_too_large_document_is_rejected_before_chunking(
+    mock_chunks, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    document = {"text": "word " * (4 * QUIZ_MAX_DOCUMENT_TOKENS), "long_document": True}
+    for path in ("/quiz/", "/quiz/stream", "/quiz/jobs"):
+        resp = client.post(path, json=document, headers=auth_headers)
+        assert resp.status_code == 413
+        assert "limit" in resp.json()["detail"]
+    mock_chunks.assert_not_called()
@@ -0,0 +1,113 @@
+import asyncio
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from src.quiz.models.history import QuizHistory
+from src.quiz.models.quiz import QuizResponse
+from src.quiz.services.history import HistoryWriter, history_writer, text_hash
+from tests.conftest import TestingAsyncSessionLocal
+from tests.test_quiz import MOCK_PAYLOAD, MOCK_RESPONSE
+
+
+@patch("src.quiz.router.agenerate_quiz_json")
+def test_history_is_written_in_batches_and_paginated(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_generate.return_value = MOCK_PAYLOAD
+    for i in range(3):
+        client.post("/quiz/", json={"text": f"Text {i}"}, headers=auth_headers)
+
+    # Nothing reaches the database before the writer flushes
+    assert history_writer.pending == 3
+    assert client.get("/quiz/history", headers=auth_headers).json()["items"] == []
+    assert asyncio.run(history_writer.flush()) == 3
+
+    seen = []
+    cursor = None
+    for _ in range(2):
+        params: dict[str, str | int] = {"limit": 2}
+        if cursor is not None:
+            params["cursor"] = cursor
+        page = client.get("/quiz/history", params=params, headers=auth_headers).json()
+        seen += page["items"]
+        cursor = page["next_cursor"]
+
+    assert cursor is None
+    assert [item["text_hash"] for item in seen] == [
+        text_hash(f"Text {i}") for i in (2, 1, 0)
+    ]
+    assert seen[0]["quiz"]["quizzes"][0]["question"] == "What is Python?"
+
+
+@patch("src.quiz.router.agenerate_quiz_json")
+def test_history_is_private_to_its_owner(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_generate.return_value = MOCK_PAYLOAD
+    client.post("/quiz/", json={"text": "Text"}, headers=auth_headers)
+    asyncio.run(history_writer.flush())
+
+    client.post("/auth/signup", json={"username": "other", "password": "pass"})
+    token = client.post(
+        "/auth/login", json={"username": "other", "password": "pass"}
+    ).json()["access_token"]
+
+    resp = client.get("/quiz/history", headers={"Authorization": f"Bearer {token}"})
+    assert resp.json() == {"items": [], "next_cursor": None}
+
+
+def test_history_rejects_invalid_cursor(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    resp = client.get(
+        "/quiz/history", params={"cursor": "not-a-cursor"}, headers=auth_headers
+    )
+    assert resp.status_code == 400
+
+
+def test_failed_flush_keeps_rows_for_next_time() -> None:
+    def broken_session():
+        raise OperationalError("INSERT", {}, Exception("database is down"))
+
+    writer = HistoryWriter(session_factory=broken_session, max_pending=2)  # ty: ignore[invalid-argument-type]
+    quiz = QuizResponse.model_validate(MOCK_RESPONSE)
+    for i in range(3):
+        writer.record(1, f"Text {i}", quiz)
+
+    assert asyncio.run(writer.flush()) == 0
+    assert writer.pending == 2
+    assert writer.dropped == 1
+
+
+def test_writer_keeps_running_after_unexpected_errors() -> None:
+    calls = 0
+
+    def flaky_session():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionRefusedError("database is down")
+        return TestingAsyncSessionLocal()
+
+    writer = HistoryWriter(session_factory=flaky_session, flush_interval=0.01)  # ty: ignore[invalid-argument-type]
+    writer.record(1, "Text", QuizResponse.model_validate(MOCK_RESPONSE))
+    writer.record(1, "Broken", b"not json")
+
+    async def main() -> list[str]:
+        writer.start()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if writer.pending == 0:
+                break
+        await writer.stop()
+        async with TestingAsyncSessionLocal() as db:
+            return list(await db.scalars(select(QuizHistory.text_hash)))
+
+    assert asyncio.run(main()) == [text_hash("Text")]
+
+    assert calls >= 2
+    assert writer.pending == 0
+    assert writer.dropped == 1
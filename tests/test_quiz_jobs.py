@@ -0,0 +1,154 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import httpx
+from anthropic import APIConnectionError, APIStatusError, BadRequestError
+from fastapi.testclient import TestClient
+
+from src.quiz.models.job import JobStatus, QuizJob
+from src.quiz.models.quiz import QuizResponse
+from src.quiz.services.jobs import QuizJobWorker, claim_job, is_transient
+from src.quiz.services.limits import UpstreamBusy
+from tests.conftest import TestingSessionLocal
+from tests.test_quiz import MOCK_RESPONSE
+
+
+def _worker(max_attempts: int = 5) -> QuizJobWorker:
+    return QuizJobWorker(
+        lambda: MagicMock(),
+        session_factory=TestingSessionLocal,
+        max_attempts=max_attempts,
+    )
+
+
+def _enqueue(client: TestClient, auth_headers: dict[str, str]) -> str:
+    resp = client.post("/quiz/jobs", json={"text": "Some text"}, headers=auth_headers)
+    assert resp.status_code == 202
+    assert resp.json()["status"] == "pending"
+    return resp.json()["id"]
+
+
+@patch("src.quiz.services.jobs.agenerate_quiz")
+def test_job_runs_to_completion(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_generate.return_value = QuizResponse.model_validate(MOCK_RESPONSE)
+    job_id = _enqueue(client, auth_headers)
+
+    assert asyncio.run(_worker().run_once()) is True
+    assert asyncio.run(_worker().run_once()) is False
+
+    resp = client.get(f"/quiz/jobs/{job_id}", headers=auth_headers)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["status"] == "done"
+    assert data["attempts"] == 1
+    assert data["result"]["quizzes"][0]["question"] == "What is Python?"
+
+
+@patch("src.quiz.services.jobs.agenerate_quiz")
+def test_job_retries_with_backoff_then_fails(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_generate.side_effect = UpstreamBusy()
+    job_id = _enqueue(client, auth_headers)
+
+    asyncio.run(_worker(max_attempts=2).run_once())
+    with TestingSessionLocal() as db:
+        job = db.get(QuizJob, job_id)
+        assert job is not None
+        assert job.status == JobStatus.PENDING
+        assert job.attempts == 1
+        # Backoff: not claimable again right away
+        assert claim_job(db) is None
+        job.run_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.commit()
+
+    asyncio.run(_worker(max_attempts=2).run_once())
+    resp = client.get(f"/quiz/jobs/{job_id}", headers=auth_headers)
+    assert resp.json()["status"] == "failed"
+    assert resp.json()["error"] == "Too many quiz generations in progress"
+
+
+@patch("src.quiz.services.jobs.agenerate_quiz")
+def test_permanent_failure_is_not_retried(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    errors = [
+        ValueError("Invalid model output"),
+        BadRequestError(
+            "prompt is too long",
+            response=httpx.Response(400, request=request),
+            body=None,
+        ),
+    ]
+    for error in errors:
+        mock_generate.side_effect = error
+        job_id = _enqueue(client, auth_headers)
+
+        asyncio.run(_worker().run_once())
+
+        data = client.get(f"/quiz/jobs/{job_id}", headers=auth_headers).json()
+        assert data["status"] == "failed"
+        assert data["attempts"] == 1
+
+
+def test_transient_errors() -> None:
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+
+    def status_error(code: int) -> APIStatusError:
+        response = httpx.Response(code, request=request)
+        return APIStatusError("error", response=response, body=None)
+
+    assert is_transient(UpstreamBusy())
+    assert is_transient(APIConnectionError(request=request))
+    assert is_transient(status_error(429))
+    assert is_transient(status_error(529))
+    assert not is_transient(status_error(400))
+    assert not is_transient(ValueError("Invalid model output"))
+
+
+def test_expired_lease_is_reclaimed(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    job_id = _enqueue(client, auth_headers)
+
+    with TestingSessionLocal() as db:
+        assert claim_job(db) == (
+            job_id,
+            1,
+            1,
+            {**_request_defaults(), "text": "Some text"},
+        )
+        # A crashed worker never reports back, the job stays leased
+        assert claim_job(db) is None
+        job = db.get(QuizJob, job_id)
+        assert job is not None
+        job.locked_until = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.commit()
+
+        claimed = claim_job(db)
+        assert claimed is not None
+        assert claimed[1] == 2
+
+
+def test_job_is_private_to_its_owner(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    job_id = _enqueue(client, auth_headers)
+
+    client.post("/auth/signup", json={"username": "other", "password": "pass"})
+    token = client.post(
+        "/auth/login", json={"username": "other", "password": "pass"}
+    ).json()["access_token"]
+
+    resp = client.get(
+        f"/quiz/jobs/{job_id}", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert resp.status_code == 404
+
+
+def _request_defaults() -> dict[str, object]:
+    return {"num_questions": 3, "long_document": False, "questions_per_chunk": 3}
@@ -0,0 +1,147 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
+
+from src.quiz.services.limits import (
+    PostgresTokenBucketLimiter,
+    RateLimited,
+    TokenBucketLimiter,
+    UpstreamBusy,
+    UpstreamLimiter,
+)
+from src.quiz.services.quiz import acreate_quiz
+from tests.conftest import TestingAsyncSessionLocal
+from tests.test_quiz import MOCK_PAYLOAD, _mock_message
+
+
+@patch("src.quiz.router.agenerate_quiz_json")
+def test_rate_limit_returns_429_with_retry_after(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_generate.return_value = MOCK_PAYLOAD
+    limiter = TokenBucketLimiter(per_minute=6, burst=2)
+
+    with patch("src.quiz.router.rate_limiter", limiter):
+        for _ in range(2):
+            resp = client.post("/quiz/", json={"text": "Text"}, headers=auth_headers)
+            assert resp.status_code == 200
+        resp = client.post("/quiz/", json={"text": "Text"}, headers=auth_headers)
+
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "10"
+    assert mock_generate.await_count == 2
+
+
+@patch("src.quiz.router.agenerate_quiz_json")
+def test_long_document_costs_a_token_per_chunk(
+    mock_generate, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_generate.return_value = MOCK_PAYLOAD
+    # Three chunks of about 4000 characters
+    document = "\n\n".join(f"Paragraph {i}. " + "word " * 790 for i in range(3))
+    request = {"text": document, "long_document": True}
+
+    with patch("src.quiz.router.rate_limiter", TokenBucketLimiter(60, burst=5)):
+        resp = client.post("/quiz/", json=request, headers=auth_headers)
+        assert resp.status_code == 200
+        resp = client.post("/quiz/", json=request, headers=auth_headers)
+
+    assert resp.status_code == 429
+    assert mock_generate.await_count == 1
+
+
+def test_upstream_cap_returns_503(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    with patch("src.quiz.services.quiz.upstream_limiter", UpstreamLimiter(0)):
+        resp = client.post("/quiz/", json={"text": "Some text"}, headers=auth_headers)
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "2"
+
+
+def test_stream_upstream_cap_returns_503(
+    client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    with patch("src.quiz.router.upstream_limiter", UpstreamLimiter(0)):
+        resp = client.post(
+            "/quiz/stream", json={"text": "Some text"}, headers=auth_headers
+        )
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "2"
+
+
+@patch("src.quiz.router.acreate_quiz_batch")
+def test_batch_costs_a_token_per_text(
+    mock_batch, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_batch.return_value = [(MOCK_PAYLOAD, None)] * 3
+    with patch("src.quiz.router.rate_limiter", TokenBucketLimiter(60, burst=4)):
+        batch = {"texts": ["one", "two", "three"]}
+        resp = client.post("/quiz/batch", json=batch, headers=auth_headers)
+        assert resp.status_code == 200
+        resp = client.post("/quiz/batch", json=batch, headers=auth_headers)
+        assert resp.status_code == 429
+
+    assert mock_batch.await_count == 1
+
+
+@patch("src.quiz.router.acreate_quiz_batch")
+def test_batch_larger_than_the_burst_leaves_the_bucket_in_debt(
+    mock_batch, client: TestClient, auth_headers: dict[str, str]
+) -> None:
+    mock_batch.return_value = [(MOCK_PAYLOAD, None)] * 6
+    with patch("src.quiz.router.rate_limiter", TokenBucketLimiter(60, burst=4)):
+        batch = {"texts": ["text"] * 6}
+        resp = client.post("/quiz/batch", json=batch, headers=auth_headers)
+        assert resp.status_code == 200
+        resp = client.post("/quiz/", json={"text": "Text"}, headers=auth_headers)
+
+    assert resp.status_code == 429
+    # Two tokens owed plus the one requested, at one token per second
+    assert resp.headers["Retry-After"] == "3"
+
+
+def test_cached_quiz_does_not_take_an_upstream_slot() -> None:
+    client = MagicMock()
+    client.messages.create = AsyncMock(return_value=_mock_message())
+    asyncio.run(acreate_quiz("Some text about Python", client))
+
+    limiter = UpstreamLimiter(0)
+    with patch("src.quiz.services.quiz.upstream_limiter", limiter):
+        quiz = asyncio.run(acreate_quiz("Some text about Python", client))
+        with pytest.raises(UpstreamBusy):
+            asyncio.run(acreate_quiz("Other text", client))
+
+    assert quiz.quizzes[0].question == "What is Python?"
+    assert limiter.rejected == 1
+
+
+def test_shared_bucket_is_persisted_per_user() -> None:
+    limiter = PostgresTokenBucketLimiter(
+        per_minute=60, burst=2, session_factory=TestingAsyncSessionLocal
+    )
+
+    async def run() -> None:
+        await limiter.acquire("1")
+        await limiter.acquire("1")
+        with pytest.raises(RateLimited) as exc_info:
+            await limiter.acquire("1")
+        assert 0 < exc_info.value.retry_after <= 1
+        await limiter.acquire("2")
+
+    asyncio.run(run())
+
+
+def test_shared_bucket_database_errors_are_not_rate_limits() -> None:
+    def broken_session():
+        raise IntegrityError("INSERT", {}, Exception("duplicate key"))
+
+    limiter = PostgresTokenBucketLimiter(session_factory=broken_session)  # ty: ignore[invalid-argument-type]
+
+    with pytest.raises(IntegrityError):
+        asyncio.run(limiter.acquire("1"))
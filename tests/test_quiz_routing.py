@@ -0,0 +1,125 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src.quiz.services.quiz import acreate_quiz
+from src.quiz.services.routing import (
+    MODEL,
+    LatencyTracker,
+    hedged,
+    latency_tracker,
+    parse_routes,
+    route_model,
+)
+from tests.test_quiz import MOCK_RESPONSE, _mock_message
+
+
+def _warm(model: str, seconds: float, count: int = 20) -> None:
+    for _ in range(count):
+        latency_tracker.observe(model, seconds)
+
+
+def test_texts_are_routed_by_length() -> None:
+    routes = parse_routes(" 8000=claude-sonnet, 500=claude-haiku ,")
+    assert routes == [(500, "claude-haiku"), (8000, "claude-sonnet")]
+
+    with patch("src.quiz.services.routing.model_routes", routes):
+        assert route_model("x" * 500) == "claude-haiku"
+        assert route_model("x" * 501) == "claude-sonnet"
+        assert route_model("x" * 8001) == MODEL
+
+
+def test_percentile_needs_enough_samples() -> None:
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for ms in range(1, 10):
+        tracker.observe("m", ms / 1000)
+    assert tracker.percentile("m", 95) is None
+
+    for ms in range(10, 201):
+        tracker.observe("m", ms / 1000)
+    # Only the last 100 calls count, 101ms to 200ms
+    assert tracker.percentile("m", 50) == 0.151
+    assert tracker.percentile("m", 100) == 0.2
+
+
+@patch("src.quiz.services.routing.QUIZ_HEDGE_MIN_DELAY_SECONDS", 0)
+@patch("src.quiz.services.routing.QUIZ_HEDGE_MODEL", "fast")
+def test_slow_call_is_hedged_and_cancelled() -> None:
+    _warm("slow", 0.01)
+    cancelled = []
+
+    async def call(model: str) -> str:
+        try:
+            await asyncio.sleep(1 if model == "slow" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return model
+
+    before = REGISTRY.get_sample_value(
+        "anthropic_hedges_total", {"model": "slow", "winner": "hedge"}
+    )
+    assert asyncio.run(hedged(call, "slow")) == "fast"
+    assert cancelled == ["slow"]
+    after = REGISTRY.get_sample_value(
+        "anthropic_hedges_total", {"model": "slow", "winner": "hedge"}
+    )
+    assert after == (before or 0) + 1
+
+
+@patch("src.quiz.services.routing.QUIZ_HEDGE_MIN_DELAY_SECONDS", 0)
+def test_failed_hedge_waits_for_the_first_call() -> None:
+    _warm("m", 0.01)
+    calls = 0
+
+    async def call(model: str) -> int:
+        nonlocal calls
+        calls += 1
+        attempt = calls
+        if attempt == 2:
+            raise RuntimeError("hedge failed")
+        await asyncio.sleep(0.05)
+        return attempt
+
+    assert asyncio.run(hedged(call, "m")) == 1
+
+    async def failing(model: str) -> int:
+        await asyncio.sleep(0.05)
+        raise RuntimeError(model)
+
+    with pytest.raises(RuntimeError, match="m"):
+        asyncio.run(hedged(failing, "m"))
+
+
+def test_no_hedge_before_the_latency_is_known() -> None:
+    calls = []
+
+    async def call(model: str) -> None:
+        calls.append(model)
+        await asyncio.sleep(0.02)
+
+    asyncio.run(hedged(call, "m"))
+    assert calls == ["m"]
+    assert latency_tracker.percentile("m", 100) is None
+
+
+@patch("src.quiz.services.routing.QUIZ_HEDGE_MIN_DELAY_SECONDS", 0)
+@patch("src.quiz.services.routing.QUIZ_HEDGE_MODEL", "claude-haiku")
+def test_acreate_quiz_takes_the_faster_model() -> None:
+    _warm(MODEL, 0.01)
+
+    async def create(**params: object) -> MagicMock:
+        if params["model"] == MODEL:
+            await asyncio.sleep(1)
+        return _mock_message()
+
+    client = MagicMock()
+    client.messages.create = AsyncMock(side_effect=create)
+
+    quiz = asyncio.run(acreate_quiz("What is Python?", client))
+
+    assert quiz.model_dump() == MOCK_RESPONSE
+    models = [c.kwargs["model"] for c in client.messages.create.await_args_list]
+    assert models == [MODEL, "claude-haiku"]
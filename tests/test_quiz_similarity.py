@@ -0,0 +1,150 @@
+import asyncio
+import threading
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.quiz.services.quiz import acreate_quiz, quiz_cache_key
+from src.quiz.services.similarity import MinHashIndex
+from tests.test_quiz import _mock_message
+
+REEF = (
+    "The Great Barrier Reef lies off the north-eastern coast of Australia, in the "
+    "Coral Sea. About 2,300 kilometres long, it is the largest coral reef system "
+    "in the world and can even be seen from space. It is made of more than 2,900 "
+    "individual reefs and about 900 islands, and hosts more than 1,500 species of "
+    "fish, 4,000 kinds of molluscs and 240 species of birds. It was declared a "
+    "World Heritage Site by UNESCO in 1981. Climate change causes coral "
+    "bleaching: when the water gets too warm, corals expel the algae living "
+    "inside them and turn white."
+)
+EDITED = REEF.replace("can even be seen", "is visible").replace(". ", "!  ") + "\n\n"
+
+
+def test_near_duplicates_match_within_their_namespace() -> None:
+    index = MinHashIndex()
+    key = quiz_cache_key(REEF)
+    signature = index.signature(REEF)
+    assert signature is not None
+    index.add("n3", key, signature)
+
+    assert index.signature(REEF.upper() + "!!") == signature
+    edited = index.signature(EDITED)
+    assert edited is not None
+    assert index.query("n3", edited) == key
+    assert index.query("n5", edited) is None
+
+    unrelated = index.signature("Python is a programming language. " * 10)
+    assert unrelated is not None
+    assert index.query("n3", unrelated) is None
+
+
+def test_short_texts_are_not_indexed() -> None:
+    assert MinHashIndex().signature("What is Python?") is None
+
+
+def test_acreate_quiz_reuses_quiz_of_near_duplicate_text() -> None:
+    client = MagicMock()
+    client.messages.create = AsyncMock(return_value=_mock_message())
+
+    first = asyncio.run(acreate_quiz(REEF, client))
+    second = asyncio.run(acreate_quiz(EDITED, client))
+    other_settings = asyncio.run(acreate_quiz(EDITED, client, num_questions=5))
+
+    assert first == second == other_settings
+    assert client.messages.create.await_count == 2
+
+
+def test_index_survives_restart_and_torn_writes(tmp_path: Path) -> None:
+    path = tmp_path / "similarity.idx"
+    index = MinHashIndex(path=str(path))
+    signature = index.signature(REEF)
+    assert signature is not None
+    index.add("n3", quiz_cache_key(REEF), signature)
+    index.close()
+    with path.open("ab") as f:
+        f.write(b"\0" * 10)
+
+    restarted = MinHashIndex(path=str(path))
+    restarted.load()
+
+    assert len(restarted) == 1
+    assert restarted.query("n3", signature) == quiz_cache_key(REEF)
+    assert path.stat().st_size == 10 + 8 + 32 + 4 * restarted.num_perm
+
+
+def test_index_written_with_other_settings_is_reset(tmp_path: Path) -> None:
+    path = tmp_path / "similarity.idx"
+    index = MinHashIndex(path=str(path))
+    signature = index.signature(REEF)
+    assert signature is not None
+    index.add("n3", quiz_cache_key(REEF), signature)
+    index.close()
+
+    other = MinHashIndex(num_perm=128, path=str(path))
+    other.load()
+
+    assert len(other) == 0
+    assert not path.exists()
+
+
+def _texts(count: int) -> list[str]:
+    return [" ".join(f"topic{i} word{j}" for j in range(30)) for i in range(count)]
+
+
+def test_oldest_entries_are_evicted_past_max_entries() -> None:
+    index = MinHashIndex(max_entries=2)
+    texts = _texts(3)
+    signatures = []
+    for text in texts:
+        signature = index.signature(text)
+        assert signature is not None
+        signatures.append(signature)
+        index.add("n3", quiz_cache_key(text), signature)
+
+    assert len(index) == 2
+    assert index.query("n3", signatures[0]) is None
+    assert index.query("n3", signatures[2]) == quiz_cache_key(texts[2])
+
+
+def test_index_file_is_compacted_once_bounded(tmp_path: Path) -> None:
+    path = tmp_path / "similarity.idx"
+    index = MinHashIndex(path=str(path), max_entries=2)
+    texts = _texts(5)
+    for text in texts:
+        signature = index.signature(text)
+        assert signature is not None
+        index.add("n3", quiz_cache_key(text), signature)
+    index.close()
+
+    record_size = 8 + 32 + 4 * index.num_perm
+    # Compacted to 2 records at the fourth entry, then one more was appended
+    assert path.stat().st_size == 10 + 3 * record_size
+
+    restarted = MinHashIndex(path=str(path), max_entries=2)
+    restarted.load()
+    assert len(restarted) == 2
+    for text in texts[3:]:
+        signature = restarted.signature(text)
+        assert signature is not None
+        assert restarted.query("n3", signature) == quiz_cache_key(text)
+
+
+def test_add_does_not_wait_for_the_file(tmp_path: Path) -> None:
+    index = MinHashIndex(path=str(tmp_path / "similarity.idx"))
+    written = threading.Event()
+    release = threading.Event()
+
+    def slow_append(record: bytes) -> None:
+        release.wait(5)
+        written.set()
+
+    signature = index.signature(REEF)
+    assert signature is not None
+    with patch.object(index, "_append", slow_append):
+        index.add("n3", quiz_cache_key(REEF), signature)
+
+        assert index.query("n3", signature) == quiz_cache_key(REEF)
+        assert not written.is_set()
+        release.set()
+        index.close()
+    assert written.is_set()
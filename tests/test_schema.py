@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from src.schema import SCHEMA_VERSION, current_version, ensure_schema
+
+
+def test_ensure_schema_migrates_a_fresh_database() -> None:
+    engine = create_engine("sqlite://")
+    assert current_version(engine) is None
+
+    ensure_schema(engine, auto_migrate=True)
+
+    assert current_version(engine) == SCHEMA_VERSION
+    assert "users" in inspect(engine).get_table_names()
+    # Up to date, runs again without touching anything
+    ensure_schema(engine, auto_migrate=False)
+
+
+def test_ensure_schema_refuses_to_migrate_when_disabled() -> None:
+    engine = create_engine("sqlite://")
+
+    with pytest.raises(RuntimeError, match="src.manage migrate"):
+        ensure_schema(engine, auto_migrate=False)
+    assert inspect(engine).get_table_names() == []
+
+
+def test_heavy_dependencies_are_not_imported_at_startup() -> None:
+    code = (
+        "import sys, src.main; "
+        "print(sorted({'anthropic', 'jose', 'scalar_fastapi', 'sentry_sdk'} "
+        "& set(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=os.environ | {"DATABASE_URL": "sqlite://"},
+    )
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,102 @@
+import hashlib
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from src.quiz.models.quiz import QuizResponse
+from src.quiz.services.cache import QuizCache
+from src.shared_cache import SharedMemoryCache
+from tests.test_quiz import MOCK_RESPONSE
+
+
+def _key(name: str) -> str:
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def _cache(path: Path, **kwargs) -> SharedMemoryCache:
+    options = {"slots": 64, "slot_size": 256, "ttl": 60, "ways": 4} | kwargs
+    return SharedMemoryCache(path, **options)
+
+
+def test_values_round_trip_and_expire(tmp_path: Path) -> None:
+    cache = _cache(tmp_path / "cache", ttl=0.05)
+    assert cache.get(_key("a")) is None
+    assert cache.set(_key("a"), b"value")
+    assert cache.get(_key("a")) == b"value"
+    assert cache.set(_key("a"), b"other")
+    assert cache.get(_key("a")) == b"other"
+    assert len(cache) == 1
+
+    time.sleep(0.06)
+    assert cache.get(_key("a")) is None
+    assert len(cache) == 0
+
+
+def test_full_set_evicts_least_recently_read(tmp_path: Path) -> None:
+    # One set of two slots, every key competes for it
+    cache = _cache(tmp_path / "cache", slots=2, ways=2)
+    cache.set(_key("a"), b"1")
+    cache.set(_key("b"), b"2")
+    assert cache.get(_key("a")) == b"1"
+
+    cache.set(_key("c"), b"3")
+
+    assert cache.get(_key("b")) is None
+    assert cache.get(_key("a")) == b"1"
+    assert cache.get(_key("c")) == b"3"
+
+
+def test_values_larger_than_a_slot_are_skipped(tmp_path: Path) -> None:
+    cache = _cache(tmp_path / "cache")
+    assert not cache.set(_key("a"), b"x" * cache.capacity + b"x")
+    assert cache.set(_key("b"), b"x" * cache.capacity)
+    assert cache.get(_key("a")) is None
+    assert cache.oversize == 1
+
+
+def test_processes_share_entries(tmp_path: Path) -> None:
+    path = tmp_path / "cache"
+    cache = _cache(path)
+    cache.set(_key("parent"), b"hello")
+    code = (
+        "import sys; from src.shared_cache import SharedMemoryCache; "
+        f"c = SharedMemoryCache({str(path)!r}, slots=64, slot_size=256, ttl=60, ways=4); "
+        f"sys.stdout.write(c.get({_key('parent')!r}).decode()); "
+        f"c.set({_key('child')!r}, b'hi')"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout == "hello"
+    assert cache.get(_key("child")) == b"hi"
+
+
+def test_file_with_another_layout_is_replaced(tmp_path: Path) -> None:
+    path = tmp_path / "cache"
+    old = _cache(path)
+    old.set(_key("a"), b"value")
+
+    new = _cache(path, slots=128)
+    assert new.get(_key("a")) is None
+    new.set(_key("b"), b"value")
+
+    # Workers with the old layout keep their own file, unlinked but still mapped
+    assert old.get(_key("a")) == b"value"
+    assert path.stat().st_size == new.size_bytes
+
+
+def test_quiz_cache_reads_through_shared_tier(tmp_path: Path) -> None:
+    path = tmp_path / "cache"
+    quiz = QuizResponse.model_validate(MOCK_RESPONSE)
+    QuizCache(persistent=False, shared=_cache(path, slot_size=4096)).set(
+        _key("k"), quiz
+    )
+
+    # Another worker, its own in-process tier is empty
+    other = QuizCache(persistent=False, shared=_cache(path, slot_size=4096))
+    assert other.get(_key("k")) == quiz
+    assert other.stats()["shared_hits"] == 1
+    assert other.get(_key("k")) == quiz
+    assert other.stats()["memory_hits"] == 1
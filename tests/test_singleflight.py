@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_async_concurrent_calls_share_one_execution() -> None:
+    flight: AsyncSingleFlight[str, int] = AsyncSingleFlight()
+    calls = 0
+
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def main() -> list[int]:
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert calls == 1
+    assert flight.shared == 4
+
+
+def test_async_error_reaches_every_caller() -> None:
+    flight: AsyncSingleFlight[str, int] = AsyncSingleFlight()
+
+    async def work() -> int:
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main() -> list[int | BaseException]:
+        return await asyncio.gather(
+            *(flight.do("key", work) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_async_cancelled_caller_does_not_cancel_others() -> None:
+    flight: AsyncSingleFlight[str, int] = AsyncSingleFlight()
+
+    async def work() -> int:
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main() -> int:
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 42
+
+
+def test_async_work_cancelled_when_every_caller_leaves() -> None:
+    flight: AsyncSingleFlight[str, int] = AsyncSingleFlight()
+    finished = False
+
+    async def work() -> int:
+        nonlocal finished
+        await asyncio.sleep(0.05)
+        finished = True
+        return 42
+
+    async def main() -> None:
+        caller = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+        # A later call starts afresh instead of joining the cancelled task
+        assert await flight.do("key", work) == 42
+
+    asyncio.run(main())
+    assert finished
+
+
+def test_threaded_calls_share_one_execution() -> None:
+    flight: SingleFlight[str, int] = SingleFlight()
+    calls = 0
+    results: list[int] = []
+
+    def work() -> int:
+        nonlocal calls
+        calls += 1
+        time.sleep(0.05)
+        return 42
+
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("key", work)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 5
+    assert calls == 1